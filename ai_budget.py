@@ -0,0 +1,199 @@
+"""
+Token accounting, context trimming and per-user quotas for Gemini calls.
+
+* estimate_tokens / estimate_prompt_tokens: cheap size estimate (about four
+  characters per token) used before a call, when the real count is unknown.
+* trim_messages: keep system messages and the newest turns that fit a prompt
+  budget, truncating the newest message itself if it alone is too large, and
+  raising PromptTooLargeError when not even part of it fits.
+* AiBudget: per-user request-rate and daily-token quotas, plus usage and
+  latency totals per user and per endpoint. Gemini's usageMetadata is used
+  when the response has it, the estimate otherwise.
+
+Counters live in process memory, so with several gunicorn workers each
+worker enforces the quotas on its own share of the traffic.
+"""
+import math
+import threading
+import time
+from collections import defaultdict, deque
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+DAY = 24 * 60 * 60
+
+
+class QuotaExceededError(RuntimeError):
+    """Raised by AiBudget.reserve(); retry_after is seconds until the limit frees up."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PromptTooLargeError(ValueError):
+    """Raised by trim_messages() when the newest turn cannot be kept within the prompt budget."""
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def _message_texts(message):
+    c = message.get("content")
+    if isinstance(c, str):
+        return [c]
+    if isinstance(c, list):
+        return [item.get("text", "") for item in c if isinstance(item, dict)]
+    return []
+
+
+def estimate_message_tokens(message):
+    return MESSAGE_OVERHEAD_TOKENS + sum(estimate_tokens(t) for t in _message_texts(message))
+
+
+def estimate_prompt_tokens(messages):
+    return sum(estimate_message_tokens(m) for m in messages)
+
+
+def _truncate_message(message, max_tokens):
+    budget_chars = max(0, (max_tokens - MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN)
+    text = "".join(_message_texts(message))[:budget_chars]
+    return {**message, "content": [{"type": "text", "text": text}]}
+
+
+def trim_messages(messages, max_prompt_tokens):
+    """
+    Return the messages that fit in max_prompt_tokens: every system message,
+    then the newest other messages, oldest dropped first. Order is preserved.
+    Raises PromptTooLargeError rather than return a prompt with no question in it.
+    """
+    system = [m for m in messages if m.get("role") == "system"]
+    rest = [m for m in messages if m.get("role") != "system"]
+    budget = max_prompt_tokens - estimate_prompt_tokens(system)
+    kept = []
+    for message in reversed(rest):
+        cost = estimate_message_tokens(message)
+        if cost > budget:
+            if not kept and budget > MESSAGE_OVERHEAD_TOKENS:
+                # The newest message alone is too big: keep as much of it as fits.
+                kept.append(_truncate_message(message, budget))
+            break
+        kept.append(message)
+        budget -= cost
+    if rest and not kept:
+        raise PromptTooLargeError("The message does not fit in the AI prompt budget.")
+    kept.reverse()
+    return system + kept
+
+
+def usage_from_response(raw):
+    """(prompt_tokens, output_tokens) from a Gemini response's usageMetadata, or (None, None)."""
+    if not isinstance(raw, dict):
+        return None, None
+    usage = raw.get("usageMetadata") or {}
+    return usage.get("promptTokenCount"), usage.get("candidatesTokenCount")
+
+
+def _new_totals():
+    return {"requests": 0, "errors": 0, "prompt_tokens": 0, "output_tokens": 0,
+            "latency_total": 0.0, "latency_max": 0.0}
+
+
+def _summarise(t):
+    return {
+        "requests": t["requests"],
+        "errors": t["errors"],
+        "prompt_tokens": t["prompt_tokens"],
+        "output_tokens": t["output_tokens"],
+        "latency_avg_ms": round(t["latency_total"] / t["requests"] * 1000, 1) if t["requests"] else 0.0,
+        "latency_max_ms": round(t["latency_max"] * 1000, 1),
+    }
+
+
+class AiBudget:
+    def __init__(self, requests_per_minute, tokens_per_day):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_day = tokens_per_day
+        self._lock = threading.Lock()
+        self._requests = defaultdict(deque)  # user_id -> request timestamps (last minute)
+        self._tokens = defaultdict(deque)    # user_id -> [timestamp, tokens] (last day)
+        self._by_user = defaultdict(_new_totals)
+        self._by_endpoint = defaultdict(_new_totals)
+
+    def _expire(self, user_id, now):
+        requests = self._requests[user_id]
+        while requests and requests[0] <= now - 60:
+            requests.popleft()
+        tokens = self._tokens[user_id]
+        while tokens and tokens[0][0] <= now - DAY:
+            tokens.popleft()
+        return requests, tokens
+
+    def reserve(self, user_id, estimated_tokens):
+        """
+        Admit one call for user_id expected to use estimated_tokens, or raise
+        QuotaExceededError. The request and its estimated tokens count against
+        the limits at once, so parallel calls cannot all pass the same check.
+        Returns a reservation for record() (to correct the tokens) or release().
+        """
+        now = time.time()
+        with self._lock:
+            requests, tokens = self._expire(user_id, now)
+            if self.requests_per_minute and len(requests) >= self.requests_per_minute:
+                retry = math.ceil(requests[0] + 60 - now)
+                raise QuotaExceededError("Too many AI requests; please slow down.", max(1, retry))
+            if self.tokens_per_day:
+                used = sum(n for _, n in tokens)
+                if used + estimated_tokens > self.tokens_per_day:
+                    retry = math.ceil(tokens[0][0] + DAY - now) if tokens else DAY
+                    raise QuotaExceededError("Daily AI token quota reached.", max(1, retry))
+            requests.append(now)
+            reservation = [now, estimated_tokens]
+            tokens.append(reservation)
+            return reservation
+
+    def release(self, user_id, reservation):
+        """Undo reserve() for a call that never went upstream (e.g. the AI queue was full)."""
+        with self._lock:
+            tokens = self._tokens[user_id]
+            for i, entry in enumerate(tokens):
+                if entry is reservation:
+                    del tokens[i]
+                    break
+            try:
+                self._requests[user_id].remove(reservation[0])
+            except ValueError:
+                pass
+
+    def record(self, user_id, endpoint, prompt_tokens, output_tokens, latency, ok, reservation=None):
+        with self._lock:
+            if reservation is not None:
+                # Replace the reserved estimate with the real count.
+                reservation[1] = prompt_tokens + output_tokens
+            else:
+                self._tokens[user_id].append([time.time(), prompt_tokens + output_tokens])
+            for totals in (self._by_user[user_id], self._by_endpoint[endpoint]):
+                totals["requests"] += 1
+                totals["errors"] += 0 if ok else 1
+                totals["prompt_tokens"] += prompt_tokens
+                totals["output_tokens"] += output_tokens
+                totals["latency_total"] += latency
+                totals["latency_max"] = max(totals["latency_max"], latency)
+
+    def user_report(self, user_id):
+        now = time.time()
+        with self._lock:
+            requests, tokens = self._expire(user_id, now)
+            used_today = sum(n for _, n in tokens)
+            return {
+                "usage": _summarise(self._by_user[user_id]),
+                "requests_last_minute": len(requests),
+                "requests_per_minute_limit": self.requests_per_minute,
+                "tokens_last_day": used_today,
+                "tokens_per_day_limit": self.tokens_per_day,
+            }
+
+    def endpoint_report(self):
+        with self._lock:
+            return {endpoint: _summarise(t) for endpoint, t in self._by_endpoint.items()}
@@ -3,19 +3,77 @@ import secrets
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g
 from datetime import timedelta
 from faq_data import faq_data
-from fuzzywuzzy import process
+import ai_budget
+import sessions
+import storage
+import workqueue
 import re
 import math
-from sympy import Eq, solve, simplify, sympify
+import functools
+import gzip
 import json
 import os
-import requests
+import sys
 import logging
+import threading
+import time
+
+try:
+    import brotli  # optional: enables Content-Encoding: br
+except ImportError:
+    brotli = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+# ------------------------------------
+# Lazy imports for heavy dependencies
+# ------------------------------------
+# sympy, numpy, fuzzywuzzy and requests cost several hundred milliseconds to
+# import. Only the math, FAQ and AI paths need them, so they are loaded on
+# first attribute access instead of at startup. import_timings records how
+# long each one took so the benchmark suite can track it.
+import_timings = {}
+
+
+class _LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            started = time.perf_counter()
+            __import__(self._name)
+            module = sys.modules[self._name]
+            import_timings.setdefault(self._name, round(time.perf_counter() - started, 4))
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+sympy = _LazyModule("sympy")
+np = _LazyModule("numpy")
+fuzzy_process = _LazyModule("fuzzywuzzy.process")
+requests = _LazyModule("requests")
+LAZY_MODULES = (sympy, np, fuzzy_process, requests)
+
+
+def load_heavy_modules():
+    """Force-load every lazy dependency (used by warm-up) and return import_timings."""
+    for module in LAZY_MODULES:
+        module._load()
+    return dict(import_timings)
+
+
 # ------------------------------------
 # App config
 # ------------------------------------
@@ -26,18 +84,80 @@ app.secret_key = os.environ.get("SECRET_KEY", "supersecretkey")
 app.config['SESSION_PERMANENT'] = False
 app.permanent_session_lifetime = timedelta(days=7)
 
+# Server-side session cache (see sessions.py). Sessions idle for longer than
+# SESSION_IDLE_TIMEOUT seconds are logged out; the cookie's last-seen stamp is
+# refreshed at most every SESSION_TOUCH_INTERVAL seconds to avoid a Set-Cookie per request.
+SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", str(2 * 60 * 60)))
+SESSION_TOUCH_INTERVAL = 60
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# Sessions and user invalidations are shared by all workers on the host through
+# SESSION_DB_FILE; set it to "" for a per-process store (single worker only).
+SESSION_DB_FILE = os.getenv("SESSION_DB_FILE", "sessions.db")
+session_store = sessions.SessionStore(
+    SESSION_IDLE_TIMEOUT, maxsize=SESSION_CACHE_SIZE,
+    shared=sessions.SqliteSessionBackend(SESSION_DB_FILE) if SESSION_DB_FILE else None)
+
 PEOPLE_FILE = "people.json"
 CHATS_FILE = "chats.json"
 
+# Storage backend: "json" (people.json / chats.json) or "sqlite" (SQLITE_FILE).
+# Move existing JSON data across with: python migrate_json_to_sqlite.py
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_FILE = os.getenv("SQLITE_FILE", "mathsolver.db")
+
 # Gemini configuration (HTTP approach)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Point at a local stand-in (python gemini_stub.py) for offline tests and benchmarks.
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
 
 if GEMINI_API_KEY:
     logger.info("Gemini API key found in environment; will use Gemini model: %s", GEMINI_MODEL)
 else:
     logger.info("No Gemini API key found in environment; AI endpoints will return 503 until configured.")
 
+# ------------------------------------
+# Work queues (bounded concurrency + backpressure)
+# ------------------------------------
+# SymPy solves (CPU) and Gemini calls (network) get separate executors so a burst
+# of one cannot starve the other. When an executor's workers and queue are all
+# taken, requests are refused at once with 503 + Retry-After. Solves run in child
+# processes (parallel, and killed at MATH_TIMEOUT); Gemini calls just wait on I/O.
+# Limits are per process: under gunicorn (WEB_CONCURRENCY workers x GUNICORN_THREADS
+# threads) the host runs up to WEB_CONCURRENCY times each, and a worker refuses work
+# only once its threads outnumber an executor's workers + queue. The defaults keep
+# both below the 32 threads gunicorn.conf.py gives each worker.
+math_executor = workqueue.ProcessBoundedExecutor(
+    "math",
+    # One core's worth of solver processes per CPU across all workers.
+    max_workers=int(os.getenv("MATH_WORKERS", str(
+        max(1, (os.cpu_count() or 2) // int(os.getenv("WEB_CONCURRENCY", "1")))))),
+    max_queue=int(os.getenv("MATH_QUEUE_DEPTH", "8")),
+    timeout=float(os.getenv("MATH_TIMEOUT", "20")))
+ai_executor = workqueue.BoundedExecutor(
+    "ai",
+    max_workers=int(os.getenv("AI_WORKERS", "16")),
+    max_queue=int(os.getenv("AI_QUEUE_DEPTH", "8")),
+    # call_gemini_generate's own HTTP timeout is 20s; leave room for time spent queued.
+    timeout=float(os.getenv("AI_TIMEOUT", "45")))
+
+
+# ------------------------------------
+# Gemini budget (token accounting, context trimming, per-user quotas)
+# ------------------------------------
+AI_MAX_PROMPT_TOKENS = int(os.getenv("AI_MAX_PROMPT_TOKENS", "2000"))
+ai_usage = ai_budget.AiBudget(
+    requests_per_minute=int(os.getenv("AI_REQUESTS_PER_MINUTE", "10")),
+    tokens_per_day=int(os.getenv("AI_TOKENS_PER_DAY", "100000")))
+
+
+def backoff_response(payload, status, retry_after=None):
+    response = jsonify(payload)
+    response.status_code = status
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
+
 # ------------------------------------
 # Password hashing helpers
 # ------------------------------------
@@ -63,22 +183,6 @@ def verify_password(stored_password: str, provided_password: str) -> bool:
     return secrets.compare_digest(provided_hash, stored_hash)
 
 
-def load_people():
-    if not os.path.exists(PEOPLE_FILE):
-        return []
-    try:
-        with open(PEOPLE_FILE, 'r') as f:
-            data = json.load(f)
-            return data if isinstance(data, list) else []
-    except Exception:
-        return []
-
-
-def save_people(data):
-    with open(PEOPLE_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
-
-
 def validate_password(password):
     if not (8 <= len(password) <= 16):
         return "Password must be between 8 and 16 characters long."
@@ -94,63 +198,206 @@ def validate_password(password):
     return None
 
 
+# ------------------------------------
+# User storage helpers
+# ------------------------------------
+store = storage.open_backend(STORAGE_BACKEND, PEOPLE_FILE, CHATS_FILE, SQLITE_FILE)
+logger.info("Using %s storage backend", store.name)
+
+
+def load_people():
+    # Raises storage.StorageError on a corrupt file rather than returning [] and losing every user on next save.
+    return store.load_people()
+
+
+def save_people(data):
+    old = {p.get('user_id'): p for p in load_people()}
+    store.save_people(data)
+    # Only sessions of users whose record changed or was removed refill from storage.
+    new = {p.get('user_id'): p for p in data}
+    for user_id, user in old.items():
+        if new.get(user_id) != user:
+            session_store.invalidate_user(user_id)
+
+
+def get_user(user_id):
+    return store.get_user(user_id)
+
+
+def find_user(identifier):
+    """Look up a user by email or username."""
+    return store.find_user(identifier)
+
+
 # ------------------------------------
 # Chats storage helpers (per-user)
 # ------------------------------------
+# With the JSON backend, per-user updates are appended to chats.json.journal and
+# folded into chats.json by a background compactor (see storage.JournaledJsonStore).
 def _load_chats_file():
-    if not os.path.exists(CHATS_FILE):
-        return {}
-    try:
-        with open(CHATS_FILE, 'r') as f:
-            data = json.load(f)
-            return data if isinstance(data, dict) else {}
-    except Exception:
-        return {}
+    return store.load_all_chats()
 
 
 def _save_chats_file(data):
     # data must be a dict mapping user_id -> chat-structure
     try:
-        with open(CHATS_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+        store.save_all_chats(data)
     except Exception as e:
         logger.exception("Failed to save chats file: %s", e)
 
 
 def load_user_chats(user_id):
-    all_chats = _load_chats_file()
-    key = str(user_id)
-    if key in all_chats:
-        return all_chats[key]
+    data = store.get_user_chats(user_id)
+    if data is not None:
+        return data
     # default structure
     default = {"active": {"Chat 1": []}, "archived": {}, "meta": {}}
-    all_chats[key] = default
-    _save_chats_file(all_chats)
+    store.put_user_chats(user_id, default)
     return default
 
 
 def save_user_chats(user_id, data):
     if not isinstance(data, dict):
         raise ValueError("data must be a dict")
-    all_chats = _load_chats_file()
-    all_chats[str(user_id)] = data
-    _save_chats_file(all_chats)
+    store.put_user_chats(user_id, data)
 
 
 # ------------------------------------
 # Request hook to load logged in user
 # ------------------------------------
+def start_user_session(user):
+    sid = sessions.new_session_id()
+    # Do NOT set session.permanent here. That avoids the 7-day persistent cookie.
+    session['user_id'] = user['user_id']
+    session['sid'] = sid
+    session['seen'] = int(time.time())
+    session.permanent = False
+    session_store.put(sid, user)
+
+
+def end_user_session():
+    session_store.delete(session.get('sid'))
+    for key in ('user_id', 'sid', 'seen'):
+        session.pop(key, None)
+
+
 @app.before_request
 def load_logged_in_user():
     user_id = session.get('user_id')
     g.user = None
     g.username = None
-    if user_id is not None:
-        people = load_people()
-        user = next((p for p in people if p.get('user_id') == user_id), None)
-        if user:
-            g.user = user
-            g.username = user.get('username')
+    if user_id is None:
+        return
+    now = int(time.time())
+    # Cookies issued before the idle timeout existed have no stamp: start their clock now.
+    seen = session.setdefault('seen', now)
+    if now - seen > SESSION_IDLE_TIMEOUT:
+        end_user_session()
+        return
+    sid = session.get('sid')
+    user = session_store.get_user(sid, user_id, get_user) if sid else None
+    if user is None:
+        # No live server-side session: logged out (possibly from a copy of this
+        # cookie), idle-expired, account removed, or a cookie from before sids.
+        end_user_session()
+        return
+    if now - seen >= SESSION_TOUCH_INTERVAL:
+        session['seen'] = now
+        session_store.touch(sid)
+    g.user = user
+    g.username = user.get('username')
+
+
+# ------------------------------------
+# Response compression and static asset caching
+# ------------------------------------
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+
+_static_hashes = {}
+_compressed_static = {}
+
+
+def static_hash(filename):
+    """Short content hash of a static file, recomputed only when its mtime changes."""
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _static_hashes.get(filename)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    _static_hashes[filename] = (mtime, digest)
+    return digest
+
+
+@app.template_global()
+def static_url(filename):
+    """url_for('static') with a ?v=<content hash> so the URL can be cached forever."""
+    return url_for('static', filename=filename, v=static_hash(filename))
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(data, encoding, static):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else 5)
+    return gzip.compress(data, compresslevel=9 if static else 6)
+
+
+@app.after_request
+def add_caching_and_compression(response):
+    is_static = request.endpoint == 'static'
+    if is_static:
+        filename = (request.view_args or {}).get('filename', '')
+        version = request.args.get('v')
+        if version and version == static_hash(filename):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            # Unversioned or outdated URL: allow caching but revalidate (ETag/Last-Modified -> 304).
+            response.cache_control.no_cache = True
+
+    if (response.status_code != 200 or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+    if is_static:
+        # send_file streams from disk; read it so it can be compressed (once per file version).
+        response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    etag, _ = response.get_etag()
+    if is_static and etag:
+        key = (filename, etag, encoding)
+        compressed = _compressed_static.get(key)
+        if compressed is None:
+            compressed = _compressed_static[key] = _compress(data, encoding, True)
+    else:
+        compressed = _compress(data, encoding, False)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # Weak: the compressed bytes differ, but the representation is equivalent (If-None-Match still matches).
+        response.set_etag(etag, weak=True)
+    return response
 
 
 # ------------------------------------
@@ -164,12 +411,9 @@ def login():
     if request.method == "POST":
         identifier = request.form.get('identifier', '').strip()
         password = request.form.get('password', '').strip()
-        people = load_people()
-        user = next((p for p in people if p.get('email') == identifier or p.get('username') == identifier), None)
+        user = find_user(identifier)
         if user and verify_password(user['password'], password):
-            # Do NOT set session.permanent here. That avoids the 7-day persistent cookie.
-            session['user_id'] = user['user_id']
-            session.permanent = False
+            start_user_session(user)
             return redirect(url_for('index'))
         else:
             error = "Invalid username/email or password."
@@ -185,10 +429,10 @@ def signup():
         email = request.form.get('email', '').strip()
         username = request.form.get('username', '').strip()
         password = request.form.get('password', '').strip()
-        people = load_people()
-        if any(p.get('email') == email for p in people):
+        conflict = store.user_conflict(email, username)
+        if conflict == "email":
             error = "Email already registered."
-        elif any(p.get('username') == username for p in people):
+        elif conflict == "username":
             error = "Username already taken."
         else:
             pass_error = validate_password(password)
@@ -196,21 +440,22 @@ def signup():
                 error = pass_error
             else:
                 hashed_password = hash_password(password)
-                new_user_id = max([p.get('user_id', 0) for p in people] + [0]) + 1
-                new_user = {'user_id': new_user_id, 'email': email, 'username': username, 'password': hashed_password}
-                people.append(new_user)
-                save_people(people)
-                # initialize empty per-user chats
-                save_user_chats(new_user_id, {"active": {"Chat 1": []}, "archived": {}, "meta": {}})
-                session['user_id'] = new_user['user_id']
-                session.permanent = False
-                return redirect(url_for('index'))
+                try:
+                    # create_user re-checks uniqueness atomically, so a concurrent signup cannot slip in between.
+                    new_user = store.create_user(email, username, hashed_password)
+                except storage.UserExistsError as e:
+                    error = "Email already registered." if e.field == "email" else "Username already taken."
+                else:
+                    # initialize empty per-user chats
+                    save_user_chats(new_user['user_id'], {"active": {"Chat 1": []}, "archived": {}, "meta": {}})
+                    start_user_session(new_user)
+                    return redirect(url_for('index'))
     return render_template("signup.html", error=error)
 
 
 @app.route("/logout")
 def logout():
-    session.pop('user_id', None)
+    end_user_session()
     return redirect(url_for('login'))
 
 
@@ -229,8 +474,18 @@ def api_get_chats():
     if g.user is None:
         return jsonify({"error": "Authentication required"}), 401
     user_id = g.user['user_id']
-    data = load_user_chats(user_id)
-    return jsonify(data)
+    # Read the version before the data: a concurrent write can then only make the ETag stale (a miss), never newer.
+    version = store.get_user_chats_version(user_id)
+    etag = f"{user_id}-{version}" if version is not None else None
+    if etag and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(load_user_chats(user_id))
+    if etag:
+        response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 
 @app.route("/api/chats", methods=["POST"])
@@ -265,7 +520,7 @@ for entry in faq_data:
 def faq_lookup(text):
     if not faq_questions:
         return None
-    best, score = process.extractOne(text.lower(), faq_questions)
+    best, score = fuzzy_process.extractOne(text.lower(), faq_questions)
     if score >= 30:
         idx = faq_questions.index(best)
         return faq_answers[idx]
@@ -299,7 +554,7 @@ def normalize_input(text):
 
 def parse_equation(eq_string):
     L, R = eq_string.split('=', 1)
-    return sympify(L) - sympify(R)
+    return sympy.sympify(L) - sympy.sympify(R)
 
 
 def generate_steps_for_equation(L_start, R_start):
@@ -309,8 +564,8 @@ def generate_steps_for_equation(L_start, R_start):
     def clean_expr_str(expr):
         return str(expr).replace('*', '')
 
-    L = simplify(L_start)
-    R = simplify(R_start)
+    L = sympy.simplify(L_start)
+    R = sympy.simplify(R_start)
 
     steps.append(f"Given:{BR}<strong>{clean_expr_str(L)} = {clean_expr_str(R)}</strong>")
 
@@ -319,8 +574,8 @@ def generate_steps_for_equation(L_start, R_start):
     R_new = R
 
     if R_vars != 0:
-        L_new = simplify(L - R_vars)
-        R_new = simplify(R - R_vars)
+        L_new = sympy.simplify(L - R_vars)
+        R_new = sympy.simplify(R - R_vars)
 
         R_vars_display = clean_expr_str(R_vars)
 
@@ -329,14 +584,14 @@ def generate_steps_for_equation(L_start, R_start):
         steps.append(f"Resulting equation: <strong>{clean_expr_str(L_new)} = {R_new}</strong>")
 
     L_const = L_new.subs({v: 0 for v in L_new.free_symbols})
-    L_vars = simplify(L_new - L_const)
+    L_vars = sympy.simplify(L_new - L_const)
 
     L_final = L_vars
     R_final = R_new
 
     if L_const != 0:
-        L_final = simplify(L_vars)
-        R_final = simplify(R_new - L_const)
+        L_final = sympy.simplify(L_vars)
+        R_final = sympy.simplify(R_new - L_const)
 
         steps.append(
             f"<strong>Step 2:</strong> Move the constant term (<strong>{L_const}</strong>) from the left side to the right side.")
@@ -368,8 +623,8 @@ def generate_steps_for_equation(L_start, R_start):
             g = math.gcd(g, n)
 
     if g > 1:
-        L_simp = simplify(L_final / g)
-        R_simp = simplify(R_final / g)
+        L_simp = sympy.simplify(L_final / g)
+        R_simp = sympy.simplify(R_final / g)
 
         steps.append(
             f"<strong>Step 3:</strong> Simplify the equation by dividing all terms by their Greatest Common Divisor (<strong>{g}</strong>).")
@@ -389,7 +644,7 @@ def generate_steps_for_equation(L_start, R_start):
 
         if len(L_start.free_symbols) == 1:
             x = list(L_start.free_symbols)[0]
-            sol = solve(Eq(L_start, R_start), x)
+            sol = sympy.solve(sympy.Eq(L_start, R_start), x)
             if sol:
                 final_solution_text = f"<strong>Final Solution:</strong>{BR}<strong>{x} = {sol[0]}</strong>"
 
@@ -398,6 +653,135 @@ def generate_steps_for_equation(L_start, R_start):
     return "Let's solve the equation step by step:<br><br>" + "<br><br>".join(formatted_steps)
 
 
+# ------------------------------------
+# Numeric evaluation over ranges (vectorized via lambdify)
+# ------------------------------------
+MAX_EVAL_POINTS = 1_000_000
+EVAL_TABLE_ROWS = 20
+EVAL_PREVIEW_ROWS = 5
+
+_NUM = r'[-+]?\d+(?:\.\d+)?'
+EVAL_RANGE_RE = re.compile(
+    r'^(?:evaluate|eval|compute|calculate|tabulate|table(?:\s+of\s+values)?(?:\s+of|\s+for)?)?\s*'
+    r'(?P<expr>.+?)\s+for\s+(?P<var>[A-Za-z])\s*(?:from|=|in)?\s*'
+    rf'(?P<start>{_NUM})\s*(?:to|\.\.)\s*(?P<stop>{_NUM})'
+    rf'(?:\s*(?:step|by)\s*(?P<step>{_NUM}))?\s*$',
+    re.IGNORECASE)
+EVAL_VALUES_RE = re.compile(
+    r'^(?:evaluate|eval|compute|calculate|tabulate|table(?:\s+of\s+values)?(?:\s+of|\s+for)?)?\s*'
+    r'(?P<expr>.+?)\s+for\s+(?P<var>[A-Za-z])\s*(?:in|=)\s*'
+    rf'[\[({{]?\s*(?P<values>{_NUM}(?:\s*,\s*{_NUM})+)\s*[\])}}]?\s*$',
+    re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_numeric_expression(expr_str, var_name):
+    """
+    Parse and compile an expression once into a NumPy-vectorized function of var_name.
+    Cached by (expression, variable) so repeated range requests skip sympify/lambdify.
+    Returns (sympy_expr, fn).
+    """
+    var = sympy.Symbol(var_name)
+    expr = sympy.sympify(expr_str)
+    extra = expr.free_symbols - {var}
+    if extra:
+        raise ValueError("unexpected variables: " + ", ".join(sorted(str(v) for v in extra)))
+    return expr, sympy.lambdify(var, expr, modules="numpy")
+
+
+def evaluate_over_values(expr_str, var_name, xs):
+    """Evaluate a compiled expression over the array xs in a single vectorized call."""
+    expr, fn = compile_numeric_expression(expr_str, var_name)
+    with np.errstate(all='ignore'):
+        ys = np.asarray(fn(xs), dtype=float)
+    # constant expressions come back as scalars
+    return expr, np.broadcast_to(ys, xs.shape)
+
+
+def _build_eval_points(start, stop, step):
+    if step is None:
+        step = 1.0
+    if not all(math.isfinite(v) for v in (start, stop, step)):
+        raise ValueError("the range limits and step must be finite numbers")
+    if step == 0:
+        raise ValueError("step must be non-zero")
+    if (stop - start) * step < 0:
+        step = -step
+    # Compare as a float before int(): the span / step ratio can overflow to inf.
+    ratio = (stop - start) / step
+    if not math.isfinite(ratio) or ratio + 1 > MAX_EVAL_POINTS:
+        raise ValueError(f"range has more than {MAX_EVAL_POINTS} points")
+    count = int(math.floor(ratio + 1e-9)) + 1
+    return start + step * np.arange(count, dtype=float)
+
+
+def _format_number(v):
+    if not np.isfinite(v):
+        return "undefined"
+    if float(v).is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return f"{v:.6g}"
+
+
+def _format_eval_table(var_name, xs, ys, rows):
+    body = "".join(f"<tr><td>{_format_number(xs[i])}</td><td>{_format_number(ys[i])}</td></tr>" for i in rows)
+    return f"<table class=\"eval-table\"><tr><th>{var_name}</th><th>f({var_name})</th></tr>{body}</table>"
+
+
+def parse_evaluation_request(text):
+    """
+    Detect "evaluate <expr> for x from a to b [step s]" or "<expr> for x in 1, 2, 3".
+    Returns (expr_str, var_name, xs) or None.
+    """
+    m = EVAL_RANGE_RE.match(text.strip())
+    if m:
+        step = float(m.group('step')) if m.group('step') else None
+        xs = _build_eval_points(float(m.group('start')), float(m.group('stop')), step)
+        return m.group('expr'), m.group('var'), xs
+    m = EVAL_VALUES_RE.match(text.strip())
+    if m:
+        values = [float(v) for v in m.group('values').split(',')]
+        if len(values) > MAX_EVAL_POINTS:
+            raise ValueError(f"too many values; the limit is {MAX_EVAL_POINTS}")
+        return m.group('expr'), m.group('var'), np.array(values, dtype=float)
+    return None
+
+
+def evaluate_detect_and_handle(text):
+    try:
+        parsed = parse_evaluation_request(text)
+    except (ValueError, OverflowError) as e:
+        return {"type": "algebra_error", "answer": f"Cannot evaluate over that range: {e}."}
+    if not parsed:
+        return None
+    expr_str, var_name, xs = parsed
+    try:
+        expr, ys = evaluate_over_values(expr_str, var_name, xs)
+    except Exception:
+        return {"type": "algebra_error",
+                "answer": f"Cannot evaluate that expression. Use only the variable {var_name}, e.g. x**2+3x for x from 1 to 10."}
+
+    BR = "<br>"
+    n = len(xs)
+    header = f"Values of <strong>{str(expr).replace('**', '^').replace('*', '')}</strong> for {n} value{'s' if n != 1 else ''} of {var_name}:"
+    if n <= EVAL_TABLE_ROWS:
+        return {"type": "algebra_evaluate", "answer": header + BR + _format_eval_table(var_name, xs, ys, range(n))}
+
+    finite = ys[np.isfinite(ys)]
+    stats = [f"<strong>Points:</strong> {n}"]
+    if finite.size:
+        stats += [f"<strong>Min:</strong> {_format_number(finite.min())}",
+                  f"<strong>Max:</strong> {_format_number(finite.max())}",
+                  f"<strong>Mean:</strong> {_format_number(finite.mean())}",
+                  f"<strong>Sum:</strong> {_format_number(finite.sum())}"]
+    if finite.size < n:
+        stats.append(f"<strong>Undefined:</strong> {n - finite.size}")
+    rows = list(range(EVAL_PREVIEW_ROWS)) + list(range(n - EVAL_PREVIEW_ROWS, n))
+    answer = (header + BR + BR + BR.join(stats) + BR + BR +
+              f"First and last {EVAL_PREVIEW_ROWS} values:" + BR + _format_eval_table(var_name, xs, ys, rows))
+    return {"type": "algebra_evaluate", "answer": answer}
+
+
 def algebra_detect_and_handle(text):
     if not text or not text.strip():
         return None
@@ -407,6 +791,11 @@ def algebra_detect_and_handle(text):
     if not re.search(r'[=+\-*/\d]', t):
         return None
 
+    # 0. Numeric evaluation over a range or list of values
+    evaluated = evaluate_detect_and_handle(t)
+    if evaluated:
+        return evaluated
+
     # 1. Check for system of two equations
     if ',' in t and t.count('=') >= 2:
         try:
@@ -417,7 +806,7 @@ def algebra_detect_and_handle(text):
                 vars_all = sorted(list(expr1.free_symbols.union(expr2.free_symbols)), key=str)
 
                 if len(vars_all) == 2:
-                    solution = solve((expr1, expr2), vars_all)
+                    solution = sympy.solve((expr1, expr2), vars_all)
                     if solution:
                         sol_text = ", ".join([f"{str(v)} = {solution[v]}" for v in vars_all])
                         return {"type": "algebra_solve_system",
@@ -435,8 +824,8 @@ def algebra_detect_and_handle(text):
     if '=' in t:
         try:
             L_str, R_str = t.split('=', 1)
-            left = sympify(L_str)
-            right = sympify(R_str)
+            left = sympy.sympify(L_str)
+            right = sympy.sympify(R_str)
 
             vars_all = sorted([str(v) for v in (left - right).free_symbols])
 
@@ -456,8 +845,8 @@ def algebra_detect_and_handle(text):
 
     # 3. Expression (no equal sign)
     try:
-        expr = sympify(t)
-        simp = simplify(expr)
+        expr = sympy.sympify(t)
+        simp = sympy.simplify(expr)
 
         return {"type": "algebra_simplify", "answer": f"The expression is: {t}<br><br>Simplified form: {str(simp)}"}
 
@@ -494,18 +883,20 @@ def _extract_json_from_text(t):
 def _find_first_text_in_response(obj):
     """
     Defensive search for the first generated text in a Gemini response structure.
-    Returns the first string it finds or None.
+    Only strings under a "text" key count, so fields such as role or
+    finishReason are never mistaken for the answer. Returns the string or None.
     """
-    if isinstance(obj, str):
-        return obj
     if isinstance(obj, list):
         for item in obj:
             res = _find_first_text_in_response(item)
             if res:
                 return res
     if isinstance(obj, dict):
+        text = obj.get('text')
+        if isinstance(text, str) and text.strip():
+            return text
         # common keys that may contain generated text
-        for k in ('content', 'text', 'output', 'candidates', 'response', 'message', 'messages', 'parts'):
+        for k in ('content', 'output', 'candidates', 'response', 'message', 'messages', 'parts'):
             if k in obj:
                 res = _find_first_text_in_response(obj[k])
                 if res:
@@ -558,7 +949,7 @@ def call_gemini_generate(messages, temperature=0.2, max_output_tokens=400, timeo
         }
     }
 
-    endpoint = f"https://generativelanguage.googleapis.com/v1/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
+    endpoint = f"{GEMINI_API_BASE}/v1/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}"
     headers = {"Content-Type": "application/json"}
 
     try:
@@ -597,9 +988,54 @@ def call_gemini_generate(messages, temperature=0.2, max_output_tokens=400, timeo
     return False, "No text in Gemini response", fallback_debug
 
 
+def call_gemini_for_user(user_id, endpoint, messages, temperature=0.2, max_output_tokens=400):
+    """
+    Trim messages to AI_MAX_PROMPT_TOKENS, enforce the user's quotas, run
+    call_gemini_generate on ai_executor and record tokens and latency.
+    Raises ai_budget.PromptTooLargeError, ai_budget.QuotaExceededError,
+    workqueue.QueueFullError or TimeoutError.
+    """
+    if not GEMINI_API_KEY:
+        # Nothing goes upstream, so nothing to queue or charge.
+        return call_gemini_generate(messages, temperature=temperature, max_output_tokens=max_output_tokens)
+
+    messages = ai_budget.trim_messages(messages, AI_MAX_PROMPT_TOKENS)
+    estimate = ai_budget.estimate_prompt_tokens(messages)
+    reservation = ai_usage.reserve(user_id, estimate + max_output_tokens)
+
+    def job():
+        started = time.perf_counter()
+        ok, text_or_err, raw = call_gemini_generate(messages, temperature=temperature,
+                                                    max_output_tokens=max_output_tokens)
+        latency = time.perf_counter() - started
+        prompt_tokens, output_tokens = ai_budget.usage_from_response(raw)
+        if prompt_tokens is None:
+            prompt_tokens = estimate
+        if output_tokens is None:
+            output_tokens = ai_budget.estimate_tokens(text_or_err) if ok else 0
+        ai_usage.record(user_id, endpoint, prompt_tokens, output_tokens, latency, ok, reservation)
+        return ok, text_or_err, raw
+
+    try:
+        return ai_executor.run(job)
+    except workqueue.QueueFullError:
+        # Refused before reaching Gemini: give the request and tokens back.
+        ai_usage.release(user_id, reservation)
+        raise
+
+
 # ------------------------------------
 # /new_ai_chat endpoint (uses call_gemini_generate)
 # ------------------------------------
+# Local starter chat returned when Gemini gives nothing usable
+FALLBACK_STARTER_MSGS = [
+    {"user": "Hello", "bot": "<p>👋 Hi! I'm a Math Tutor. Ask me an equation like <code>2x+3=7</code> or request <code>HCF of 12 and 18</code>.</p>"},
+    {"user": "HCF of 12 and 18", "bot": "<p>The HCF of 12 and 18 is <strong>6</strong>.</p>"},
+    {"user": "Solve 2x+3=7", "bot": "<p>Let's solve: 2x + 3 = 7<br><strong>Step 1:</strong> Subtract 3 from both sides => 2x = 4<br><strong>Step 2:</strong> Divide both sides by 2 => x = 2</p>"},
+    {"user": "Limitations", "bot": "<p>⚠️ I work best with integer arithmetic and basic algebra. Advanced calculus and symbolic edge-cases may not be supported.</p>"}
+]
+
+
 @app.route("/new_ai_chat", methods=["POST"])
 def new_ai_chat():
     if g.user is None:
@@ -623,20 +1059,23 @@ def new_ai_chat():
         {"role": "user", "content": [{"type": "text", "text": user_prompt}]}
     ]
 
-    ok, text_or_err, raw = call_gemini_generate(messages, temperature=0.2, max_output_tokens=400)
+    try:
+        ok, text_or_err, raw = call_gemini_for_user(g.user['user_id'], "new_ai_chat", messages,
+                                                    temperature=0.2, max_output_tokens=400)
+    except ai_budget.PromptTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ai_budget.QuotaExceededError as e:
+        return backoff_response({"error": str(e)}, 429, e.retry_after)
+    except workqueue.QueueFullError as e:
+        return backoff_response({"error": "The AI service is busy. Please try again shortly."}, 503, e.retry_after)
+    except TimeoutError:
+        return backoff_response({"error": "The AI service took too long to respond."}, 504)
     if not ok:
         # Log the issue for server-side debugging
         logger.warning("Gemini new_ai_chat returned no valid text (ok=False): %s", text_or_err)
 
-        # Build a small local fallback starter chat so the UI can still create an AI chat
-        fallback_msgs = [
-            {"user": "Hello", "bot": "<p>👋 Hi! I'm a Math Tutor. Ask me an equation like <code>2x+3=7</code> or request <code>HCF of 12 and 18</code>.</p>"},
-            {"user": "HCF of 12 and 18", "bot": "<p>The HCF of 12 and 18 is <strong>6</strong>.</p>"},
-            {"user": "Solve 2x+3=7", "bot": "<p>Let's solve: 2x + 3 = 7<br><strong>Step 1:</strong> Subtract 3 from both sides => 2x = 4<br><strong>Step 2:</strong> Divide both sides by 2 => x = 2</p>"},
-            {"user": "Limitations", "bot": "<p>⚠️ I work best with integer arithmetic and basic algebra. Advanced calculus and symbolic edge-cases may not be supported.</p>"}
-        ]
-
-        return jsonify({"chat_name": chat_name, "messages": fallback_msgs})
+        # Fall back to the local starter chat so the UI can still create an AI chat
+        return jsonify({"chat_name": chat_name, "messages": FALLBACK_STARTER_MSGS})
 
     # try to parse JSON array from the returned text
     parsed = _extract_json_from_text(text_or_err)
@@ -655,13 +1094,7 @@ def new_ai_chat():
         return jsonify({"chat_name": chat_name, "messages": [{"user": "Hello", "bot": text_or_err}]})
 
     # Last fallback: same local starter
-    fallback_msgs = [
-        {"user": "Hello", "bot": "<p>👋 Hi! I'm a Math Tutor. Ask me an equation like <code>2x+3=7</code> or request <code>HCF of 12 and 18</code>.</p>"},
-        {"user": "HCF of 12 and 18", "bot": "<p>The HCF of 12 and 18 is <strong>6</strong>.</p>"},
-        {"user": "Solve 2x+3=7", "bot": "<p>Let's solve: 2x + 3 = 7<br><strong>Step 1:</strong> Subtract 3 from both sides => 2x = 4<br><strong>Step 2:</strong> Divide both sides by 2 => x = 2</p>"},
-        {"user": "Limitations", "bot": "<p>⚠️ I work best with integer arithmetic and basic algebra. Advanced calculus and symbolic edge-cases may not be supported.</p>"}
-    ]
-    return jsonify({"chat_name": chat_name, "messages": fallback_msgs})
+    return jsonify({"chat_name": chat_name, "messages": FALLBACK_STARTER_MSGS})
 
 
 # ------------------------------------
@@ -708,7 +1141,17 @@ def ai_reply():
         {"role": "user", "content": [{"type": "text", "text": last_user_text}]}
     ]
 
-    ok, text_or_err, raw = call_gemini_generate(gemini_messages, temperature=0.2, max_output_tokens=600)
+    try:
+        ok, text_or_err, raw = call_gemini_for_user(g.user['user_id'], "ai_reply", gemini_messages,
+                                                    temperature=0.2, max_output_tokens=600)
+    except ai_budget.PromptTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ai_budget.QuotaExceededError as e:
+        return backoff_response({"error": str(e)}, 429, e.retry_after)
+    except workqueue.QueueFullError as e:
+        return backoff_response({"error": "The AI service is busy. Please try again shortly."}, 503, e.retry_after)
+    except TimeoutError:
+        return backoff_response({"error": "The AI service took too long to respond."}, 504)
     if not ok:
         logger.info("Gemini ai_reply failed: %s", text_or_err)
         return jsonify({"error": f"Gemini API error: {text_or_err}"}), 502
@@ -720,19 +1163,12 @@ def ai_reply():
 # ------------------------------------
 # Existing rule-based /send endpoint
 # ------------------------------------
-@app.route("/send", methods=["POST"])
-def send():
-    if g.user is None:
-        return jsonify({"reply": "Authentication required. Please log in.", "type": "auth_error"}), 401
-    data = request.json
-    text = data.get("message", "").strip() if data else ""
-    if not text:
-        return jsonify({"reply": "Please type a message.", "type": "fallback"})
-
+def handle_message(text):
+    """Run the rule-based pipeline (HCF/LCM, algebra, FAQ, fallback) and return the /send payload."""
     # 1) HCF/LCM
     h = parse_hcf_lcm(text)
     if h:
-        return jsonify({"reply": h["answer"], "type": h["type"]})
+        return {"reply": h["answer"], "type": h["type"]}
 
     # 2) Algebra (expressions/equations/systems)
     alg = algebra_detect_and_handle(text)
@@ -741,22 +1177,121 @@ def send():
         for k, v in alg.items():
             if k not in ['answer', 'type']:
                 response[k] = v
-        return jsonify(response)
+        return response
 
     # 3) FAQ
     f = faq_lookup(text)
     if f:
-        return jsonify({"reply": f, "type": "faq"})
+        return {"reply": f, "type": "faq"}
 
     fallback = next((e["answer"] for e in faq_data if any(q.lower() == "fallback" for q in e.get("questions", []))),
                     "I couldn't understand that.")
-    return jsonify({"reply": fallback, "type": "fallback"})
+    return {"reply": fallback, "type": "fallback"}
+
+
+@app.route("/send", methods=["POST"])
+def send():
+    if g.user is None:
+        return jsonify({"reply": "Authentication required. Please log in.", "type": "auth_error"}), 401
+    data = request.json
+    text = data.get("message", "").strip() if data else ""
+    if not text:
+        return jsonify({"reply": "Please type a message.", "type": "fallback"})
+    try:
+        return jsonify(math_executor.run(handle_message, text))
+    except workqueue.QueueFullError as e:
+        return backoff_response({"reply": "The solver is busy right now. Please try again in a few seconds.",
+                                    "type": "busy"}, 503, e.retry_after)
+    except TimeoutError:
+        return backoff_response({"reply": "That problem took too long to solve. Try a simpler form.",
+                                    "type": "timeout"}, 504)
+
+
+# ------------------------------------
+# Warm-up and readiness
+# ------------------------------------
+# Canned inputs that touch every branch of handle_message so SymPy's lazy
+# initialisation, the lambdify cache and the FAQ matcher are paid for once,
+# before gunicorn forks workers (preload_app) rather than on the first /send.
+WARMUP_CORPUS = [
+    "HCF of 12 and 18",
+    "LCM of 4, 6 and 10",
+    "2x+3=7",
+    "3x+2=x+10",
+    "2x+3y=10",
+    "x+y=5, x-y=1",
+    "(x**2-1)/(x-1)",
+    "evaluate x**2+3x for x from 1 to 1000",
+    "2x+1 for x in 1, 2, 5",
+    "What is this AI?",
+    "How do you work?",
+]
+WARMUP_TEMPLATES = ["login.html", "signup.html", "index.html"]
+
+_warmup_done = threading.Event()
+_warmup_lock = threading.Lock()
+warmup_report = {}
+
+
+def warm_up():
+    """
+    Exercise the parser, solver, FAQ index and templates on WARMUP_CORPUS.
+    Idempotent; marks the process ready for /ready once finished.
+    """
+    with _warmup_lock:
+        if _warmup_done.is_set():
+            return warmup_report
+        started = time.perf_counter()
+        imports = load_heavy_modules()
+        failures = 0
+        for text in WARMUP_CORPUS:
+            try:
+                handle_message(text)
+            except Exception:
+                failures += 1
+                logger.exception("Warm-up failed for input %r", text)
+        with app.test_request_context():
+            for name in WARMUP_TEMPLATES:
+                render_template(name, error=None, username="warmup")
+        warmup_report.update({
+            "inputs": len(WARMUP_CORPUS),
+            "templates": len(WARMUP_TEMPLATES),
+            "failures": failures,
+            "imports": imports,
+            "seconds": round(time.perf_counter() - started, 3),
+        })
+        _warmup_done.set()
+        logger.info("Warm-up finished in %.3fs (%d inputs, %d failures)",
+                    warmup_report["seconds"], len(WARMUP_CORPUS), failures)
+        return warmup_report
+
+
+@app.route("/metrics")
+def metrics():
+    return jsonify({"math": math_executor.metrics(), "ai": ai_executor.metrics(),
+                    "ai_usage": ai_usage.endpoint_report()})
+
+
+@app.route("/api/usage", methods=["GET"])
+def api_usage():
+    if g.user is None:
+        return jsonify({"error": "Authentication required"}), 401
+    return jsonify(ai_usage.user_report(g.user['user_id']))
+
+
+@app.route("/ready")
+def ready():
+    if not _warmup_done.is_set():
+        return jsonify({"status": "warming"}), 503
+    return jsonify({"status": "ready", "warmup": warmup_report})
 
 
 if __name__ == "__main__":
     # ensure storage files exist
-    if not os.path.exists(PEOPLE_FILE):
-        save_people([])
-    if not os.path.exists(CHATS_FILE):
-        _save_chats_file({})
+    if STORAGE_BACKEND == "json":
+        if not os.path.exists(PEOPLE_FILE):
+            save_people([])
+        if not os.path.exists(CHATS_FILE):
+            _save_chats_file({})
+    warm_up()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+Offline load test and fallback check for the AI endpoints, run against gemini_stub.
+
+Starts the stub in-process (no network, no API key needed), points app.py at
+it and then:
+
+  * fallbacks: sends one /new_ai_chat and one /ai_reply per injected failure
+    mode (ok, HTTP error, malformed body, no text, nested text) and checks
+    that the app took the expected path (the script exits 1 if any did not);
+  * load: fires --requests requests at --concurrency against /ai_reply and
+    /new_ai_chat with the configured latency and error rate, and reports
+    status counts, latency percentiles and the ai executor metrics.
+
+Usage:
+    python benchmarks/ai_load.py [--requests 200] [--concurrency 20] [--latency-ms 100]
+                                 [--error-rate 0.05] [--seed 1] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Quotas would throttle a single benchmark user; disable them before app.py reads its config.
+os.environ.setdefault("AI_REQUESTS_PER_MINUTE", "0")
+os.environ.setdefault("AI_TOKENS_PER_DAY", "0")
+
+import gemini_stub  # noqa: E402
+
+FAILURE_MODES = {
+    "ok": {},
+    "http_error": {"error_rate": 1.0, "error_status": 503},
+    "malformed": {"malformed_rate": 1.0},
+    "no_text": {"empty_rate": 1.0},
+    "nested_text": {"nested_rate": 1.0},
+}
+
+# Path each endpoint must take per failure mode (see describe_new_chat / describe_ai_reply).
+EXPECTED_PATHS = {
+    "ok": {"new_ai_chat": "200 parsed 4 messages", "ai_reply": "200 stub reply"},
+    "http_error": {"new_ai_chat": "200 fallback starter", "ai_reply": "502 error"},
+    "malformed": {"new_ai_chat": "200 fallback starter", "ai_reply": "502 error"},
+    "no_text": {"new_ai_chat": "200 fallback starter", "ai_reply": "502 error"},
+    "nested_text": {"new_ai_chat": "200 parsed 4 messages", "ai_reply": "200 stub reply"},
+}
+
+
+def load_app(directory):
+    # Keep the benchmark's users and chats out of the real data files.
+    os.chdir(directory)
+    os.environ["STORAGE_BACKEND"] = "json"
+    import app
+    app.GEMINI_API_KEY = app.GEMINI_API_KEY or "stub-key"
+    app.app.config["TESTING"] = True
+    return app
+
+
+def logged_in_client(app):
+    client = app.app.test_client()
+    client.post("/signup", data={"email": "bench@example.com", "username": "bench", "password": "Bench#2024"})
+    if client.get("/api/usage").status_code != 200:
+        client.post("/login", data={"identifier": "bench", "password": "Bench#2024"})
+    return client
+
+
+def _clone_client(app, client):
+    other = app.app.test_client()
+    with client.session_transaction() as src, other.session_transaction() as dst:
+        dst.update(dict(src))
+    return other
+
+
+def describe_new_chat(app, r):
+    messages = (r.get_json() or {}).get("messages") or []
+    if messages == app.FALLBACK_STARTER_MSGS:
+        path = "fallback starter"
+    elif messages and messages[0].get("user") == "Hello" and len(messages) == 1:
+        path = "raw text as one message: " + str(messages[0].get("bot"))[:40]
+    else:
+        path = f"parsed {len(messages)} messages"
+    return f"{r.status_code} {path}"
+
+
+def describe_ai_reply(r):
+    body = r.get_json() or {}
+    if "reply" not in body:
+        return f"{r.status_code} error"
+    # The stub answers every /ai_reply prompt with its canned echo; anything else is a wrong extraction.
+    if str(body["reply"]).startswith("<p>Stub answer to:"):
+        return f"{r.status_code} stub reply"
+    return f"{r.status_code} unexpected reply: {str(body['reply'])[:40]}"
+
+
+def run_fallbacks(app, client):
+    results = {}
+    for mode, options in FAILURE_MODES.items():
+        server, url = gemini_stub.start_stub(**options)
+        app.GEMINI_API_BASE = url
+        try:
+            got = {
+                "new_ai_chat": describe_new_chat(app, client.post("/new_ai_chat", json={"topic": "algebra"})),
+                "ai_reply": describe_ai_reply(
+                    client.post("/ai_reply", json={"messages": [{"role": "user", "content": "2x+3=7"}]})),
+            }
+        finally:
+            server.shutdown()
+        results[mode] = {endpoint: {"got": path, "expected": EXPECTED_PATHS[mode][endpoint],
+                                    "ok": path == EXPECTED_PATHS[mode][endpoint]}
+                         for endpoint, path in got.items()}
+    return results
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_load(app, client, args):
+    server, url = gemini_stub.start_stub(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 4,
+                                         error_rate=args.error_rate, seed=args.seed)
+    app.GEMINI_API_BASE = url
+    statuses = {"ai_reply": Counter(), "new_ai_chat": Counter()}
+    latencies = {"ai_reply": [], "new_ai_chat": []}
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def worker():
+        local = _clone_client(app, client)
+        for i in counter:
+            endpoint = "new_ai_chat" if i % 5 == 0 else "ai_reply"
+            payload = ({"topic": "hcf"} if endpoint == "new_ai_chat"
+                       else {"messages": [{"role": "user", "content": f"{i}x+3=7"}]})
+            started = time.perf_counter()
+            r = local.post("/" + endpoint, json=payload)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                statuses[endpoint][r.status_code] += 1
+                latencies[endpoint].append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    server.shutdown()
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(args.requests / wall, 1) if wall else 0.0,
+        "endpoints": {
+            endpoint: {
+                "status": {str(k): v for k, v in sorted(statuses[endpoint].items())},
+                "p50_ms": round(_percentile(latencies[endpoint], 50), 1),
+                "p95_ms": round(_percentile(latencies[endpoint], 95), 1),
+                "p99_ms": round(_percentile(latencies[endpoint], 99), 1),
+            } for endpoint in statuses
+        },
+        "ai_executor": app.ai_executor.metrics(),
+        "ai_usage": app.ai_usage.endpoint_report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline AI endpoint load test against gemini_stub.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="stub latency per call")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="fraction of stub calls that fail")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory)
+        client = logged_in_client(app)
+        report = {"fallbacks": run_fallbacks(app, client), "load": run_load(app, client, args)}
+        os.chdir(ROOT)
+
+    failed = [f"{mode} {endpoint}" for mode, result in report["fallbacks"].items()
+              for endpoint, check in result.items() if not check["ok"]]
+    if args.json:
+        print(json.dumps(report, indent=2))
+        sys.exit(1 if failed else 0)
+    print("Fallback paths (status + what the app returned):")
+    for mode, result in report["fallbacks"].items():
+        row = "  ".join(f"{endpoint}: {'ok  ' if check['ok'] else 'FAIL'} {check['got']:<24}"
+                        for endpoint, check in result.items())
+        print(f"  {mode:<12} {row}")
+    load = report["load"]
+    print(f"\nLoad: {load['requests']} requests, concurrency {load['concurrency']}, "
+          f"{load['wall_seconds']}s, {load['throughput_rps']} req/s")
+    for endpoint, stats in load["endpoints"].items():
+        print(f"  {endpoint:<12} status {stats['status']}  p50 {stats['p50_ms']} ms  "
+              f"p95 {stats['p95_ms']} ms  p99 {stats['p99_ms']} ms")
+    ex = load["ai_executor"]
+    print(f"  ai executor: wait avg {ex['wait_avg_ms']} ms (max {ex['wait_max_ms']}), "
+          f"run avg {ex['run_avg_ms']} ms, rejected {ex['rejected']}")
+    if failed:
+        print("\nUnexpected fallback paths: " + ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Startup-time report for app.py.
+
+Measures, in a fresh interpreter each time:
+  * how long ``import app`` takes (heavy dependencies stay unloaded),
+  * how long each lazily loaded dependency takes on first use,
+  * the slowest top-level modules according to ``python -X importtime``.
+
+Usage:
+    python benchmarks/import_time.py [--json] [--top N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, time
+started = time.perf_counter()
+import app
+import_app = time.perf_counter() - started
+loaded_at_import = sorted(m._name for m in app.LAZY_MODULES if m._module is not None)
+started = time.perf_counter()
+app.load_heavy_modules()
+print(json.dumps({
+    "import_app_seconds": round(import_app, 4),
+    "loaded_at_import": loaded_at_import,
+    "lazy_modules": app.import_timings,
+    "lazy_total_seconds": round(time.perf_counter() - started, 4),
+}))
+"""
+
+
+def _run(args):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def importtime_top(n):
+    """Parse ``-X importtime`` output and return the n slowest top-level imports (cumulative us)."""
+    out = _run(["-X", "importtime", "-c", "import app; app.load_heavy_modules()"]).stderr
+    rows = []
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        if name.startswith(" "):
+            continue  # nested import, already counted in its parent
+        rows.append((name, int(cumulative_us)))
+    rows.sort(key=lambda r: r[1], reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for name, us in rows[:n]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--top", type=int, default=10, help="number of -X importtime rows to show")
+    args = parser.parse_args()
+
+    report = json.loads(_run(["-c", PROBE]).stdout.strip().splitlines()[-1])
+    report["importtime_top"] = importtime_top(args.top)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"import app:                {report['import_app_seconds'] * 1000:8.1f} ms")
+    print(f"heavy modules at import:   {', '.join(report['loaded_at_import']) or 'none'}")
+    for name, seconds in sorted(report["lazy_modules"].items(), key=lambda kv: -kv[1]):
+        print(f"  lazy {name:<21}{seconds * 1000:8.1f} ms")
+    print(f"lazy total:                {report['lazy_total_seconds'] * 1000:8.1f} ms")
+    print("slowest top-level imports (-X importtime, cumulative):")
+    for row in report["importtime_top"]:
+        print(f"  {row['module']:<25}{row['cumulative_ms']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
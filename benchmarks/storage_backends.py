@@ -0,0 +1,92 @@
+"""
+Compare the JSON and SQLite storage backends.
+
+Seeds each backend in a temporary directory with --users accounts, each
+holding --chats chats of --messages messages, then times the operations the
+request path performs: user lookup by id (every authenticated request),
+lookup by login, loading one user's chats and saving one user's chats.
+
+Usage:
+    python benchmarks/storage_backends.py [--users 2000] [--chats 5] [--messages 20] [--ops 200] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+
+def make_chats(n_chats, n_messages, seed):
+    rnd = random.Random(seed)
+    active = {f"Chat {c + 1}": [{"user": f"{rnd.randint(1, 99)}x+{rnd.randint(1, 99)}=7",
+                                 "bot": "Let's solve the equation step by step:<br><br>..."}
+                                for _ in range(n_messages)]
+              for c in range(n_chats)}
+    return {"active": active, "archived": {}, "meta": {}}
+
+
+def seed(backend, users, chats, messages):
+    backend.save_people([{"user_id": i, "email": f"user{i}@example.com", "username": f"user{i}",
+                          "password": "00$00"} for i in range(1, users + 1)])
+    backend.save_all_chats({str(i): make_chats(chats, messages, i) for i in range(1, users + 1)})
+
+
+def timed(fn, ops):
+    started = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter() - started) / ops * 1000
+
+
+def run(name, directory, args):
+    backend = storage.open_backend(name, os.path.join(directory, "people.json"),
+                                   os.path.join(directory, "chats.json"),
+                                   os.path.join(directory, "bench.db"))
+    started = time.perf_counter()
+    seed(backend, args.users, args.chats, args.messages)
+    seed_ms = (time.perf_counter() - started) * 1000
+    rnd = random.Random(0)
+    payload = make_chats(args.chats, args.messages, -1)
+    results = {
+        "seed_ms": seed_ms,
+        "get_user_ms": timed(lambda: backend.get_user(rnd.randint(1, args.users)), args.ops),
+        "find_user_ms": timed(lambda: backend.find_user(f"user{rnd.randint(1, args.users)}"), args.ops),
+        "get_user_chats_ms": timed(lambda: backend.get_user_chats(rnd.randint(1, args.users)), args.ops),
+        "put_user_chats_ms": timed(lambda: backend.put_user_chats(rnd.randint(1, args.users), payload), args.ops),
+    }
+    if hasattr(backend, "close"):
+        backend.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare JSON and SQLite storage backends.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=5)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=200, help="operations timed per measurement")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for name in ("json", "sqlite"):
+        with tempfile.TemporaryDirectory() as directory:
+            report[name] = run(name, directory, args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{args.users} users x {args.chats} chats x {args.messages} messages, {args.ops} ops each (ms/op)")
+    print(f"{'operation':<20}{'json':>12}{'sqlite':>12}")
+    for key in report["json"]:
+        print(f"{key[:-3]:<20}{report['json'][key]:>12.3f}{report['sqlite'][key]:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
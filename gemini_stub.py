@@ -0,0 +1,229 @@
+"""
+Local stand-in for the Gemini generateContent API, for offline tests and benchmarks.
+
+Serves POST /v1/models/<model>:generateContent with the response shape
+call_gemini_generate parses (candidates[0].content.parts[0].text plus
+usageMetadata), with configurable latency and injected failures:
+
+  --error-rate      reply with --error-status (e.g. 500, 429, 503) and an error body
+  --malformed-rate  reply 200 with a body that is not JSON
+  --empty-rate      reply 200 with JSON that contains no text
+  --nested-rate     reply 200 with the text somewhere other than the primary path
+
+Record/replay:
+  --record DIR --upstream URL   proxy to the real API and save each request/response pair in DIR
+  --replay DIR                  answer from the pairs saved in DIR (404 if a request was never recorded)
+
+Point the app at it with GEMINI_API_BASE=http://127.0.0.1:8089 (and any GEMINI_API_KEY).
+
+Usage:
+    python gemini_stub.py [--port 8089] [--latency-ms 200] [--jitter-ms 50] [--error-rate 0.1] ...
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+STARTER_CHAT = [
+    {"user": "Hello", "bot": "<p>Hi! I'm the stub Math Tutor.</p>"},
+    {"user": "HCF of 12 and 18", "bot": "<p>The HCF of 12 and 18 is <strong>6</strong>.</p>"},
+    {"user": "2x+3=7", "bot": "<p>Subtract 3: 2x = 4<br>Divide by 2: <strong>x = 2</strong></p>"},
+    {"user": "Limitations", "bot": "<p>I am a local stub; answers are canned.</p>"},
+]
+
+
+class StubConfig:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=500,
+                 malformed_rate=0.0, empty_rate=0.0, nested_rate=0.0,
+                 record_dir=None, upstream=None, replay_dir=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.malformed_rate = malformed_rate
+        self.empty_rate = empty_rate
+        self.nested_rate = nested_rate
+        self.record_dir = record_dir
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.replay_dir = replay_dir
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def roll(self):
+        with self.lock:
+            self.requests += 1
+            return self.random.random(), self.random.uniform(-self.jitter_ms, self.jitter_ms)
+
+
+def request_key(path, body):
+    """Stable id for a request: model path + canonical JSON body (the API key is not part of it)."""
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        canonical = body.decode("utf-8", "replace")
+    return hashlib.sha256((urlsplit(path).path + "\n" + canonical).encode("utf-8")).hexdigest()[:32]
+
+
+def _last_user_text(request_json):
+    for content in reversed(request_json.get("contents") or []):
+        if content.get("role") == "user":
+            return " ".join(p.get("text", "") for p in content.get("parts") or [] if isinstance(p, dict))
+    return ""
+
+
+def canned_text(request_json):
+    """Deterministic reply: a starter chat when a JSON array is requested, otherwise an echo."""
+    prompt = " ".join(p.get("text", "") for c in request_json.get("contents") or []
+                      for p in c.get("parts") or [] if isinstance(p, dict))
+    if "JSON array" in prompt:
+        return json.dumps(STARTER_CHAT)
+    return f"<p>Stub answer to: <code>{_last_user_text(request_json)[:200]}</code></p>"
+
+
+def generate_response(request_json, text, nested=False):
+    prompt_tokens = sum(len(p.get("text", "")) for c in request_json.get("contents") or []
+                        for p in c.get("parts") or [] if isinstance(p, dict)) // 4
+    usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text) // 4,
+             "totalTokenCount": prompt_tokens + len(text) // 4}
+    if nested:
+        # No candidates[0].content.parts[0].text; forces the defensive search path.
+        return {"response": {"output": [{"text": text}]}, "usageMetadata": usage}
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": usage}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config = StubConfig()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        cfg = self.config
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if ":generateContent" not in self.path:
+            return self._send(404, {"error": {"code": 404, "message": "Unknown method", "status": "NOT_FOUND"}})
+
+        if cfg.replay_dir:
+            return self._replay(body)
+        if cfg.upstream:
+            return self._record(body)
+
+        roll, jitter = cfg.roll()
+        delay = max(0.0, cfg.latency_ms + jitter) / 1000
+        if delay:
+            time.sleep(delay)
+        try:
+            request_json = json.loads(body)
+        except ValueError:
+            return self._send(400, {"error": {"code": 400, "message": "Invalid JSON payload", "status": "INVALID_ARGUMENT"}})
+
+        if roll < cfg.error_rate:
+            return self._send(cfg.error_status, {"error": {"code": cfg.error_status, "message": "Injected failure",
+                                                           "status": "UNAVAILABLE"}})
+        roll -= cfg.error_rate
+        if roll < cfg.malformed_rate:
+            return self._send(200, b'{"candidates": [{"content": ', "application/json")
+        roll -= cfg.malformed_rate
+        if roll < cfg.empty_rate:
+            return self._send(200, {"candidates": [{"content": {"role": "model", "parts": []},
+                                                    "finishReason": "SAFETY"}]})
+        roll -= cfg.empty_rate
+        nested = roll < cfg.nested_rate
+        self._send(200, generate_response(request_json, canned_text(request_json), nested=nested))
+
+    def _replay(self, body):
+        path = os.path.join(self.config.replay_dir, request_key(self.path, body) + ".json")
+        if not os.path.exists(path):
+            return self._send(404, {"error": {"code": 404, "message": "No recorded response for this request",
+                                              "status": "NOT_FOUND"}})
+        with open(path, "r") as f:
+            pair = json.load(f)
+        response = pair["response"]
+        self._send(response["status"], response["body"].encode("utf-8"),
+                   response.get("content_type", "application/json"))
+
+    def _record(self, body):
+        req = urllib.request.Request(self.config.upstream + self.path, data=body, method="POST",
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                status, data, content_type = resp.status, resp.read(), resp.headers.get("Content-Type")
+        except urllib.error.HTTPError as e:
+            status, data, content_type = e.code, e.read(), e.headers.get("Content-Type")
+        except Exception as e:
+            return self._send(502, {"error": {"code": 502, "message": f"Upstream error: {e}", "status": "UNAVAILABLE"}})
+        os.makedirs(self.config.record_dir, exist_ok=True)
+        pair = {
+            "path": urlsplit(self.path).path,
+            "request": json.loads(body) if body else None,
+            "response": {"status": status, "content_type": content_type or "application/json",
+                         "body": data.decode("utf-8", "replace")},
+        }
+        with open(os.path.join(self.config.record_dir, request_key(self.path, body) + ".json"), "w") as f:
+            json.dump(pair, f, indent=2)
+        self._send(status, data, content_type or "application/json")
+
+
+def start_stub(host="127.0.0.1", port=0, **options):
+    """Start the stub on a background thread; returns (server, base_url). Stop with server.shutdown()."""
+    config = StubConfig(**options)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stub_config = config
+    threading.Thread(target=server.serve_forever, name="gemini-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini generateContent stub with record/replay.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--nested-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency jitter and failure injection")
+    parser.add_argument("--record", metavar="DIR", help="record upstream request/response pairs into DIR")
+    parser.add_argument("--upstream", default="https://generativelanguage.googleapis.com",
+                        help="real API base URL used with --record")
+    parser.add_argument("--replay", metavar="DIR", help="serve responses recorded in DIR")
+    args = parser.parse_args()
+
+    server, url = start_stub(
+        args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, error_status=args.error_status, malformed_rate=args.malformed_rate,
+        empty_rate=args.empty_rate, nested_rate=args.nested_rate, seed=args.seed,
+        record_dir=args.record, upstream=args.upstream if args.record else None, replay_dir=args.replay)
+    mode = "replaying " + args.replay if args.replay else "recording into " + args.record if args.record else "stub"
+    print(f"Gemini stub ({mode}) listening on {url}; set GEMINI_API_BASE={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+# Gunicorn settings for production: gunicorn app:app
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Exported so app.py can split MATH_WORKERS' default across the worker processes.
+os.environ.setdefault("WEB_CONCURRENCY", "2")
+workers = int(os.environ["WEB_CONCURRENCY"])
+# Threaded workers: each process serves `threads` requests at once. The math and
+# ai executors' limits are per process and only refuse work (503) when a worker's
+# threads outnumber an executor's workers + queue; host totals are `workers` times them.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+# Import app.py once in the master so warm-up runs before workers are forked.
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported and before any worker is forked.
+    import app
+    report = app.warm_up()
+    server.log.info("Warm-up complete: %s", report)
+    # Move warmed objects out of the collector's generations so forked workers
+    # do not dirty (copy) the shared pages on their first collection.
+    gc.freeze()
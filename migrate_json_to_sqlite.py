@@ -0,0 +1,158 @@
+"""
+One-shot migration of people.json and chats.json (plus any pending
+chats.json.journal entries) into the SQLite backend.
+
+The JSON files are streamed element by element rather than loaded whole, and
+rows are written in batches, so memory stays flat however large they are.
+
+Usage:
+    python migrate_json_to_sqlite.py [--people people.json] [--chats chats.json]
+                                     [--db mathsolver.db] [--batch 500]
+
+Then start the app with STORAGE_BACKEND=sqlite.
+"""
+import argparse
+import json
+import os
+
+import storage
+
+CHUNK_SIZE = 64 * 1024
+_decoder = json.JSONDecoder()
+
+
+class _Stream:
+    """Buffered reader that decodes one JSON value at a time from a large file."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character ('' at end of file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, chars):
+        ch = self.peek()
+        if ch not in chars:
+            raise ValueError(f"Expected one of {chars!r}, found {ch!r}")
+        self.pos += 1
+        return ch
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may be cut short; make sure it is complete.
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(path):
+    """Yield the elements of the top-level JSON array in path."""
+    with open(path, "r") as f:
+        s = _Stream(f)
+        s.expect("[")
+        if s.peek() == "]":
+            return
+        while True:
+            yield s.value()
+            if s.expect(",]") == "]":
+                return
+
+
+def iter_json_object(path):
+    """Yield (key, value) pairs of the top-level JSON object in path."""
+    with open(path, "r") as f:
+        s = _Stream(f)
+        s.expect("{")
+        if s.peek() == "}":
+            return
+        while True:
+            key = s.value()
+            s.expect(":")
+            yield key, s.value()
+            if s.expect(",}") == "}":
+                return
+
+
+def iter_journal(path):
+    """Yield (key, value) pairs from a chats journal, skipping a torn final line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            entry = storage.parse_journal_line(line)
+            if entry is not None:
+                yield entry
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def migrate(people_path, chats_path, db_path, batch_size=500):
+    backend = storage.SqliteBackend(db_path)
+    counts = {"users": 0, "chats": 0, "journal": 0}
+    if os.path.exists(people_path):
+        for batch in _batches(iter_json_array(people_path), batch_size):
+            backend.insert_users(batch)
+            counts["users"] += len(batch)
+    if os.path.exists(chats_path):
+        for batch in _batches(iter_json_object(chats_path), batch_size):
+            backend.put_many_user_chats(batch)
+            counts["chats"] += len(batch)
+    # Journal entries are newer than the snapshot, so they are applied last and win.
+    for batch in _batches(iter_journal(chats_path + ".journal"), batch_size):
+        backend.put_many_user_chats(batch)
+        counts["journal"] += len(batch)
+    backend.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate people.json/chats.json into SQLite.")
+    parser.add_argument("--people", default="people.json")
+    parser.add_argument("--chats", default="chats.json")
+    parser.add_argument("--db", default=os.getenv("SQLITE_FILE", "mathsolver.db"))
+    parser.add_argument("--batch", type=int, default=500, help="rows per transaction")
+    args = parser.parse_args()
+
+    # Hold the JSON locks so a running JSON-backed app cannot write mid-migration.
+    with storage.get_lock(args.people), storage.get_lock(args.chats):
+        counts = migrate(args.people, args.chats, args.db, args.batch)
+    print(f"Migrated {counts['users']} users, {counts['chats']} chat records "
+          f"and {counts['journal']} journal entries into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Server-side session store used by app.py to cache the logged-in user.
+
+The signed Flask cookie still carries user_id plus a random session id
+("sid"). The resolved user record lives here, keyed by sid, so an
+authenticated request is served from memory without touching people.json or
+SQLite.
+
+SessionStore keeps a per-process LRU (MemorySessionBackend) and can sit in
+front of a shared backend so every worker sees the same sessions, logouts
+and invalidations. SqliteSessionBackend is the shared backend for workers on
+one host; any object with get(key) / set(key, value, ttl) / touch(key, ttl) /
+delete(key) / clear() works too (e.g. a thin Redis wrapper).
+
+A session exists only while its record is in the store: logging out deletes
+it, and a cookie whose sid is not found is treated as logged out rather than
+rebuilt from its user_id.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+
+class MemorySessionBackend:
+    """Thread-safe LRU of key -> value with a per-entry TTL that slides on every hit unless sliding=False."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, ttl, expires, sliding = entry
+            now = time.monotonic()
+            if ttl is not None and expires <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            if ttl is not None and sliding:
+                self._data[key] = (value, ttl, now + ttl, sliding)
+            return value
+
+    def set(self, key, value, ttl=None, sliding=True):
+        with self._lock:
+            expires = time.monotonic() + ttl if ttl is not None else None
+            self._data[key] = (value, ttl, expires, sliding)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def touch(self, key, ttl):
+        """Restart key's TTL if it is still present (never recreates a deleted key)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data[key] = (entry[0], ttl, time.monotonic() + ttl, entry[3])
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SqliteSessionBackend:
+    """
+    Shared backend for SessionStore: key -> JSON value rows in a SQLite file
+    that every worker process on the host opens. TTLs are absolute (time.time);
+    expired rows are skipped on read and purged every PURGE_EVERY writes.
+    """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._conn().execute("CREATE TABLE IF NOT EXISTS sessions "
+                             "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)")
+
+    def _conn(self):
+        # One connection per thread, reopened after fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value FROM sessions WHERE key = ? AND "
+                                   "(expires IS NULL OR expires > ?)", (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl is not None else None
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO sessions (key, value, expires) VALUES (?, ?, ?)",
+                     (key, json.dumps(value), expires))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+
+    def touch(self, key, ttl):
+        # UPDATE, not INSERT: a session deleted by a logout in another worker stays deleted.
+        self._conn().execute("UPDATE sessions SET expires = ? WHERE key = ?", (time.time() + ttl, key))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM sessions")
+
+
+class SessionStore:
+    """
+    Maps session ids to cached user records.
+
+    Idle sessions drop out after idle_timeout seconds without a request.
+    invalidate_user() bumps a per-user generation so every session holding an
+    old copy of that user misses and is refilled from storage.
+
+    With a shared backend, the shared copy is authoritative: the local LRU only
+    keeps what it read for local_ttl seconds (not extended by hits), so a
+    logout or invalidation in one worker reaches the others within local_ttl.
+    """
+
+    def __init__(self, idle_timeout, maxsize=10000, shared=None, local_ttl=5):
+        self.idle_timeout = idle_timeout
+        self.local_ttl = local_ttl
+        self.local = MemorySessionBackend(maxsize)
+        self.shared = shared
+        # Kept outside the LRU so an eviction can never make a stale record look current.
+        self._generations = {}
+
+    def _cache_locally(self, key, value):
+        self.local.set(key, value, self.local_ttl, sliding=False)
+
+    def _get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._cache_locally(key, value)
+        return value
+
+    def _set(self, key, value, ttl):
+        if self.shared is None:
+            self.local.set(key, value, ttl)
+            return
+        self.shared.set(key, value, ttl)
+        self._cache_locally(key, value)
+
+    def _delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def _generation(self, user_id):
+        if self.shared is None:
+            return self._generations.get(user_id, 0)
+        key = f"gen:{user_id}"
+        generation = self.local.get(key)
+        if generation is None:
+            generation = self.shared.get(key) or 0
+            self._cache_locally(key, generation)
+        return generation
+
+    def put(self, sid, user, generation=None):
+        if generation is None:
+            generation = self._generation(user["user_id"])
+        self._set(f"sid:{sid}", {"user": user, "gen": generation}, self.idle_timeout)
+
+    def get_user(self, sid, user_id, load_user):
+        """
+        Return the user for session sid, or None if there is no such session
+        (never started, logged out, idle too long) or it is not user_id's.
+        A record made stale by invalidate_user() is refreshed with load_user(user_id).
+        """
+        record = self._get(f"sid:{sid}")
+        if record is None or record["user"].get("user_id") != user_id:
+            return None
+        generation = self._generation(user_id)
+        if record["gen"] == generation:
+            return record["user"]
+        user = load_user(user_id)
+        if user is None:
+            # The account was removed.
+            self.delete(sid)
+            return None
+        self.put(sid, user, generation)
+        return user
+
+    def touch(self, sid):
+        """Restart sid's idle timeout (the shared copy; a local-only entry slides on every hit)."""
+        if self.shared is not None:
+            self.shared.touch(f"sid:{sid}", self.idle_timeout)
+
+    def delete(self, sid):
+        if sid:
+            self._delete(f"sid:{sid}")
+
+    def invalidate_user(self, user_id):
+        # Generations never expire; they are one small int per updated user.
+        if self.shared is None:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            return
+        key = f"gen:{user_id}"
+        generation = (self.shared.get(key) or 0) + 1
+        self.shared.set(key, generation, None)
+        self._cache_locally(key, generation)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
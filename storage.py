@@ -0,0 +1,660 @@
+"""
+Durable JSON storage helpers used by app.py.
+
+* atomic_write_json: write to a temp file in the same directory, fsync, then
+  os.replace it over the target so readers never see a half-written file.
+* FileLock / get_lock: cross-process lock (fcntl on POSIX, msvcrt on Windows)
+  held on a sidecar "<file>.lock", re-entrant within a process; shared()
+  takes it in read mode so readers do not queue behind each other.
+* JournaledJsonStore: a dict-of-records JSON file plus an append-only
+  "<file>.journal" of per-key updates. Writes are single appended lines;
+  a background thread folds the journal back into the snapshot once it grows.
+* JsonBackend / SqliteBackend: the user and chat operations app.py needs,
+  over the JSON files above or a SQLite database. open_backend() picks one.
+"""
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+class StorageError(RuntimeError):
+    """Raised when a storage file exists but cannot be read safely."""
+
+
+class UserExistsError(StorageError):
+    """Raised by create_user when the email or username is taken; .field names which."""
+
+    def __init__(self, field):
+        super().__init__(f"{field} already in use")
+        self.field = field
+
+
+# ------------------------------------
+# Locking
+# ------------------------------------
+class FileLock:
+    """Exclusive lock on path + '.lock' shared by all workers; re-entrant per process."""
+
+    def __init__(self, path):
+        self.path = path + ".lock"
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fh = None
+        self._owner = None
+
+    def __enter__(self):
+        self._rlock.acquire()
+        if self._depth == 0:
+            try:
+                self._fh = open(self.path, "a+")
+                self._acquire(self._fh)
+            except Exception:
+                if self._fh:
+                    self._fh.close()
+                    self._fh = None
+                self._rlock.release()
+                raise
+            self._owner = threading.get_ident()
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0:
+            self._owner = None
+            try:
+                self._release(self._fh)
+            finally:
+                self._fh.close()
+                self._fh = None
+        self._rlock.release()
+        return False
+
+    @contextmanager
+    def shared(self):
+        """
+        Read lock: any number of holders, in this process or others, while no
+        one holds the exclusive lock. Each holder flocks its own file handle.
+        """
+        if not fcntl or self._owner == threading.get_ident():
+            # msvcrt has no shared mode; and a thread inside its own exclusive
+            # section (compact() -> load()) must not wait on itself.
+            with self:
+                yield self
+            return
+        with open(self.path, "a+") as fh:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_SH)
+            try:
+                yield self
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _acquire(fh):
+        if fcntl:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            return
+        fh.seek(0)
+        while True:
+            try:
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                time.sleep(0.01)
+
+    @staticmethod
+    def _release(fh):
+        if fcntl:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def get_lock(path):
+    """Return the process-wide FileLock for path (one instance per file so re-entry works)."""
+    key = os.path.abspath(path)
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = FileLock(path)
+        return lock
+
+
+# ------------------------------------
+# Atomic JSON files
+# ------------------------------------
+def _fsync_dir(path):
+    # Persist the rename itself; not supported on Windows, where os.replace is already durable enough.
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path, data, indent=None):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(path)
+
+
+def read_json(path, expected_type):
+    """
+    Return the parsed contents of path, or an empty expected_type() if it does not exist.
+    A file that exists but is unreadable raises StorageError instead of looking empty,
+    so callers never overwrite real data with a blank structure.
+    """
+    if not os.path.exists(path):
+        return expected_type()
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except Exception as e:
+        raise StorageError(f"Cannot read {path}: {e}") from e
+    if not isinstance(data, expected_type):
+        raise StorageError(f"Unexpected data in {path}: expected {expected_type.__name__}")
+    return data
+
+
+# ------------------------------------
+# Snapshot + append-only journal
+# ------------------------------------
+JOURNAL_ENTRY_START = '{"key": '
+
+
+def parse_journal_line(line):
+    """
+    Return (key, value) for one journal line, or None if it cannot be read.
+    A line where a crash left a torn entry in front of a complete one is
+    recovered from the last entry start.
+    """
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        start = line.rfind(JOURNAL_ENTRY_START)
+        if start <= 0:
+            return None
+        try:
+            entry = json.loads(line[start:])
+        except ValueError:
+            return None
+    try:
+        return str(entry["key"]), entry["value"]
+    except (TypeError, KeyError):
+        return None
+
+
+class JournaledJsonStore:
+    """
+    A JSON object on disk (key -> record) with cheap per-key updates.
+
+    put() appends one {"key": ..., "value": ...} line to the journal; load()
+    replays the journal over the snapshot under a shared lock, so reads run
+    in parallel and only wait for writers. When the journal passes
+    compact_bytes, a background thread rewrites the snapshot atomically and
+    truncates the journal.
+    """
+
+    def __init__(self, path, indent=None, compact_bytes=256 * 1024, fsync=True):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.indent = indent
+        self.compact_bytes = compact_bytes
+        self.fsync = fsync
+        self.lock = get_lock(path)
+        self._wake = threading.Event()
+        self._compactor = None
+        self._compactor_pid = None
+
+    def _replay(self, data):
+        if not os.path.exists(self.journal_path):
+            return data
+        with open(self.journal_path, "r") as f:
+            lines = f.read().split("\n")
+        for n, line in enumerate(lines):
+            if not line.strip():
+                continue
+            entry = parse_journal_line(line)
+            if entry is None:
+                # Only the final line can be torn by a crash mid-append; anything else is worth a warning.
+                if n < len(lines) - 1:
+                    logger.warning("Skipping corrupt journal entry %d in %s", n + 1, self.journal_path)
+                continue
+            data[entry[0]] = entry[1]
+        return data
+
+    def load(self):
+        with self.lock.shared():
+            return self._replay(read_json(self.path, dict))
+
+    def put(self, key, value):
+        line = json.dumps({"key": str(key), "value": value}) + "\n"
+        with self.lock:
+            self._drop_torn_tail()
+            with open(self.journal_path, "a") as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                size = f.tell()
+        if size >= self.compact_bytes:
+            self._schedule_compaction()
+
+    def _drop_torn_tail(self):
+        """
+        Cut off a partial last line left by a crash mid-append (caller holds the lock).
+        Otherwise the next entry would be appended onto it and both would fail to parse.
+        """
+        try:
+            f = open(self.journal_path, "rb+")
+        except FileNotFoundError:
+            return
+        with f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return
+            # Scan backwards for the end of the last complete entry.
+            pos = end
+            while pos > 0:
+                step = min(4096, pos)
+                pos -= step
+                f.seek(pos)
+                newline = f.read(step).rfind(b"\n")
+                if newline != -1:
+                    pos += newline + 1
+                    break
+            logger.warning("Dropping %d bytes of torn journal entry in %s", end - pos, self.journal_path)
+            f.truncate(pos)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def write_snapshot(self, data):
+        """Replace the whole store (snapshot written atomically, journal cleared)."""
+        with self.lock:
+            atomic_write_json(self.path, data, indent=self.indent)
+            self._truncate_journal()
+
+    def compact(self):
+        with self.lock:
+            if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+                return False
+            atomic_write_json(self.path, self.load(), indent=self.indent)
+            self._truncate_journal()
+            return True
+
+    def _truncate_journal(self):
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "w") as f:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _schedule_compaction(self):
+        # Threads do not survive fork, so each worker starts its own compactor on first need.
+        if self._compactor_pid != os.getpid() or not self._compactor.is_alive():
+            self._compactor_pid = os.getpid()
+            self._compactor = threading.Thread(target=self._compact_loop, name="journal-compactor", daemon=True)
+            self._compactor.start()
+        self._wake.set()
+
+    def _compact_loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.compact()
+            except Exception:
+                logger.exception("Background compaction of %s failed", self.path)
+
+
+# ------------------------------------
+# Backends
+# ------------------------------------
+def _user_conflict(people, email, username):
+    if any(p.get('email') == email for p in people):
+        return "email"
+    if any(p.get('username') == username for p in people):
+        return "username"
+    return None
+
+
+class JsonBackend:
+    """people.json (atomic rewrites) and chats.json (snapshot + journal)."""
+
+    name = "json"
+
+    def __init__(self, people_path, chats_path):
+        self.people_path = people_path
+        self.people_lock = get_lock(people_path)
+        self.chats = JournaledJsonStore(chats_path, indent=2)
+
+    # users
+    def load_people(self):
+        return read_json(self.people_path, list)
+
+    def save_people(self, data):
+        with self.people_lock:
+            atomic_write_json(self.people_path, data, indent=4)
+
+    def get_user(self, user_id):
+        return next((p for p in self.load_people() if p.get('user_id') == user_id), None)
+
+    def find_user(self, identifier):
+        return next((p for p in self.load_people()
+                     if p.get('email') == identifier or p.get('username') == identifier), None)
+
+    def user_conflict(self, email, username):
+        return _user_conflict(self.load_people(), email, username)
+
+    def create_user(self, email, username, password_hash):
+        # Lock across read-check-append-save so concurrent signups cannot interleave.
+        with self.people_lock:
+            people = self.load_people()
+            conflict = _user_conflict(people, email, username)
+            if conflict:
+                raise UserExistsError(conflict)
+            new_user_id = max([p.get('user_id', 0) for p in people] + [0]) + 1
+            user = {'user_id': new_user_id, 'email': email, 'username': username, 'password': password_hash}
+            people.append(user)
+            self.save_people(people)
+        return user
+
+    # chats
+    def load_all_chats(self):
+        return self.chats.load()
+
+    def save_all_chats(self, data):
+        self.chats.write_snapshot(data)
+
+    def get_user_chats(self, user_id):
+        return self.chats.load().get(str(user_id))
+
+    def put_user_chats(self, user_id, data):
+        self.chats.put(user_id, data)
+
+    def get_user_chats_version(self, user_id):
+        """
+        Opaque token that changes whenever stored chats may have changed.
+        The JSON files have no per-user version, so this is a file-level stamp:
+        any user's write changes it, which is safe (just a cache miss).
+        """
+        stamp = []
+        for path in (self.chats.path, self.chats.journal_path):
+            try:
+                st = os.stat(path)
+                stamp.append(f"{st.st_mtime_ns:x}.{st.st_size:x}")
+            except OSError:
+                stamp.append("0")
+        return "-".join(stamp)
+
+
+# AUTOINCREMENT: a removed user's id is never handed out again, so a new
+# account cannot pick up that user's chats or still-signed session cookies.
+SQLITE_USERS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    user_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    email    TEXT NOT NULL UNIQUE,
+    username TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+);
+"""
+SQLITE_SCHEMA = SQLITE_USERS_TABLE.format(name="users") + """
+CREATE TABLE IF NOT EXISTS chat_state (
+    user_id TEXT PRIMARY KEY,
+    extra   TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS chats (
+    id       INTEGER PRIMARY KEY,
+    user_id  TEXT NOT NULL,
+    section  TEXT NOT NULL,
+    name     TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    payload  TEXT,
+    UNIQUE (user_id, section, name)
+);
+CREATE INDEX IF NOT EXISTS chats_by_user ON chats (user_id, section, position);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id  INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    data     TEXT NOT NULL,
+    PRIMARY KEY (chat_id, position)
+) WITHOUT ROWID;
+"""
+
+CHAT_SECTIONS = ("active", "archived")
+
+# Fixed SQL strings: sqlite3 keeps a per-connection cache of prepared statements keyed by the text.
+SQL_SELECT_USERS = "SELECT user_id, email, username, password FROM users ORDER BY user_id"
+SQL_SELECT_USER_BY_ID = "SELECT user_id, email, username, password FROM users WHERE user_id = ?"
+SQL_SELECT_USER_BY_LOGIN = ("SELECT user_id, email, username, password FROM users "
+                            "WHERE email = ? UNION ALL "
+                            "SELECT user_id, email, username, password FROM users WHERE username = ? LIMIT 1")
+SQL_USER_CONFLICT = ("SELECT 'email' FROM users WHERE email = ? UNION ALL "
+                     "SELECT 'username' FROM users WHERE username = ? LIMIT 1")
+SQL_INSERT_USER = "INSERT INTO users (email, username, password) VALUES (?, ?, ?)"
+SQL_UPSERT_USER = "INSERT OR REPLACE INTO users (user_id, email, username, password) VALUES (?, ?, ?, ?)"
+SQL_SELECT_STATE = "SELECT extra FROM chat_state WHERE user_id = ?"
+SQL_SELECT_STATE_USERS = "SELECT user_id FROM chat_state ORDER BY rowid"
+SQL_SELECT_VERSION = "SELECT version FROM chat_state WHERE user_id = ?"
+SQL_UPSERT_STATE = "INSERT OR REPLACE INTO chat_state (user_id, extra, version) VALUES (?, ?, ?)"
+SQL_SELECT_CHATS = "SELECT id, section, name, payload FROM chats WHERE user_id = ? ORDER BY section, position"
+SQL_SELECT_MESSAGES = ("SELECT m.chat_id, m.data FROM messages m JOIN chats c ON c.id = m.chat_id "
+                       "WHERE c.user_id = ? ORDER BY m.chat_id, m.position")
+SQL_DELETE_CHATS = "DELETE FROM chats WHERE user_id = ?"
+SQL_DELETE_ORPHAN_CHATS = "DELETE FROM chats WHERE user_id NOT IN (SELECT CAST(user_id AS TEXT) FROM users)"
+SQL_DELETE_ORPHAN_STATE = "DELETE FROM chat_state WHERE user_id NOT IN (SELECT CAST(user_id AS TEXT) FROM users)"
+SQL_INSERT_CHAT = "INSERT INTO chats (user_id, section, name, position, payload) VALUES (?, ?, ?, ?, ?)"
+SQL_INSERT_MESSAGE = "INSERT INTO messages (chat_id, position, data) VALUES (?, ?, ?)"
+
+
+def _user_row(row):
+    return {'user_id': row[0], 'email': row[1], 'username': row[2], 'password': row[3]} if row else None
+
+
+class SqliteBackend:
+    """
+    Users, chats and messages in indexed SQLite tables (WAL mode).
+
+    Each chat is a row in chats and each message a row in messages, so reading
+    or saving one user's chats touches only that user's rows. Chat values that
+    are not message lists are kept verbatim in chats.payload, and top-level
+    keys other than active/archived (e.g. "meta") in chat_state.extra.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SQLITE_SCHEMA)
+        # Databases created before chat versions existed.
+        if "version" not in [r[1] for r in conn.execute("PRAGMA table_info(chat_state)")]:
+            conn.execute("ALTER TABLE chat_state ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        # Databases created before users.user_id was AUTOINCREMENT: rebuild the table once.
+        users_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'users'").fetchone()[0]
+        if "AUTOINCREMENT" not in users_sql.upper():
+            with self._write() as conn:
+                conn.execute(SQLITE_USERS_TABLE.format(name="users_new"))
+                conn.execute("INSERT INTO users_new (user_id, email, username, password) "
+                             "SELECT user_id, email, username, password FROM users")
+                conn.execute("DROP TABLE users")
+                conn.execute("ALTER TABLE users_new RENAME TO users")
+
+    def _conn(self):
+        # One connection per thread, reopened after fork.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    class _Transaction:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def __enter__(self):
+            # IMMEDIATE takes the write lock up front so concurrent writers queue on busy_timeout.
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self.conn
+
+        def __exit__(self, exc_type, exc, tb):
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+            return False
+
+    def _write(self):
+        return self._Transaction(self._conn())
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # users
+    def load_people(self):
+        return [_user_row(r) for r in self._conn().execute(SQL_SELECT_USERS)]
+
+    def save_people(self, data):
+        with self._write() as conn:
+            conn.execute("DELETE FROM users")
+            conn.executemany(SQL_UPSERT_USER, ((p['user_id'], p['email'], p['username'], p['password'])
+                                               for p in data))
+            # Chats of users no longer in the list (messages follow via ON DELETE CASCADE).
+            conn.execute(SQL_DELETE_ORPHAN_CHATS)
+            conn.execute(SQL_DELETE_ORPHAN_STATE)
+
+    def insert_users(self, users):
+        """Upsert an iterable of user dicts in one transaction (used by the migration tool)."""
+        with self._write() as conn:
+            conn.executemany(SQL_UPSERT_USER, ((p['user_id'], p['email'], p['username'], p['password'])
+                                               for p in users))
+
+    def get_user(self, user_id):
+        return _user_row(self._conn().execute(SQL_SELECT_USER_BY_ID, (user_id,)).fetchone())
+
+    def find_user(self, identifier):
+        return _user_row(self._conn().execute(SQL_SELECT_USER_BY_LOGIN, (identifier, identifier)).fetchone())
+
+    def user_conflict(self, email, username):
+        row = self._conn().execute(SQL_USER_CONFLICT, (email, username)).fetchone()
+        return row[0] if row else None
+
+    def create_user(self, email, username, password_hash):
+        with self._write() as conn:
+            row = conn.execute(SQL_USER_CONFLICT, (email, username)).fetchone()
+            if row:
+                raise UserExistsError(row[0])
+            user_id = conn.execute(SQL_INSERT_USER, (email, username, password_hash)).lastrowid
+        return {'user_id': user_id, 'email': email, 'username': username, 'password': password_hash}
+
+    # chats
+    def get_user_chats(self, user_id):
+        conn = self._conn()
+        key = str(user_id)
+        state = conn.execute(SQL_SELECT_STATE, (key,)).fetchone()
+        if state is None:
+            return None
+        data = {section: {} for section in CHAT_SECTIONS}
+        lists = {}
+        for chat_id, section, name, payload in conn.execute(SQL_SELECT_CHATS, (key,)):
+            if payload is not None:
+                data[section][name] = json.loads(payload)
+            else:
+                lists[chat_id] = data[section][name] = []
+        for chat_id, message in conn.execute(SQL_SELECT_MESSAGES, (key,)):
+            if chat_id in lists:
+                lists[chat_id].append(json.loads(message))
+        data.update(json.loads(state[0]))
+        return data
+
+    def _put_user_chats(self, conn, key, data):
+        conn.execute(SQL_DELETE_CHATS, (key,))
+        for section in CHAT_SECTIONS:
+            chats = data.get(section) or {}
+            for position, (name, value) in enumerate(chats.items()):
+                payload = None if isinstance(value, list) else json.dumps(value)
+                chat_id = conn.execute(SQL_INSERT_CHAT, (key, section, name, position, payload)).lastrowid
+                if payload is None:
+                    conn.executemany(SQL_INSERT_MESSAGE,
+                                     ((chat_id, i, json.dumps(m)) for i, m in enumerate(value)))
+        extra = {k: v for k, v in data.items() if k not in CHAT_SECTIONS}
+        # A random version (not a counter) stays unique even after save_all_chats wipes the table.
+        conn.execute(SQL_UPSERT_STATE, (key, json.dumps(extra), secrets.randbits(62)))
+
+    def put_user_chats(self, user_id, data):
+        with self._write() as conn:
+            self._put_user_chats(conn, str(user_id), data)
+
+    def put_many_user_chats(self, items):
+        """Write an iterable of (user_id, data) pairs in one transaction (used by the migration tool)."""
+        with self._write() as conn:
+            for user_id, data in items:
+                self._put_user_chats(conn, str(user_id), data)
+
+    def get_user_chats_version(self, user_id):
+        row = self._conn().execute(SQL_SELECT_VERSION, (str(user_id),)).fetchone()
+        return f"{row[0]:x}" if row else None
+
+    def load_all_chats(self):
+        users = [r[0] for r in self._conn().execute(SQL_SELECT_STATE_USERS)]
+        return {key: self.get_user_chats(key) for key in users}
+
+    def save_all_chats(self, data):
+        with self._write() as conn:
+            conn.execute("DELETE FROM chats")
+            conn.execute("DELETE FROM chat_state")
+            for key, value in data.items():
+                self._put_user_chats(conn, str(key), value)
+
+
+def open_backend(name, people_path, chats_path, sqlite_path):
+    """Return the storage backend selected by name ("json" or "sqlite")."""
+    if name == "json":
+        return JsonBackend(people_path, chats_path)
+    if name == "sqlite":
+        return SqliteBackend(sqlite_path)
+    raise ValueError(f"Unknown storage backend: {name!r} (expected 'json' or 'sqlite')")
@@ -0,0 +1,261 @@
+"""
+Bounded executors used by app.py to cap concurrent SymPy solves and Gemini calls.
+
+Each BoundedExecutor runs at most max_workers jobs at once and holds at most
+max_queue more waiting. Anything beyond that is refused immediately with
+QueueFullError, which the routes turn into 503 + Retry-After instead of letting
+every request slow down together. metrics() reports queue depth, wait time and
+run time for the /metrics endpoint.
+
+BoundedExecutor runs jobs on threads, which suits I/O such as HTTP calls; a
+thread cannot be stopped, so a job that outlives its timeout keeps its slot
+until it returns. ProcessBoundedExecutor runs each job in a child process
+instead: CPU-bound jobs run in parallel, and a job still running at its
+deadline is killed so its slot frees up when run() gives up on it.
+"""
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as wait_futures
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit() when the executor is at capacity; retry_after is a hint in seconds."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} queue is full")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, name, max_workers, max_queue, timeout):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._local = threading.local()
+        self._stats = {
+            "submitted": 0, "rejected": 0, "completed": 0, "failed": 0, "cancelled": 0,
+            "queued": 0, "running": 0,
+            "wait_total": 0.0, "wait_max": 0.0, "run_total": 0.0, "run_max": 0.0,
+        }
+
+    def _get_pool(self):
+        # Created lazily and per process: a pool inherited across gunicorn's fork has no live threads.
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def retry_after(self):
+        """Seconds until a slot is likely free, from the average run time and current backlog."""
+        with self._lock:
+            done = self._stats["completed"] + self._stats["failed"]
+            avg_run = self._stats["run_total"] / done if done else 1.0
+            backlog = self._stats["queued"] + self._stats["running"]
+        return max(1, min(60, math.ceil(avg_run * backlog / self.max_workers)))
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise QueueFullError(self.name, self.retry_after())
+        enqueued = time.perf_counter()
+        deadline = enqueued + self.timeout if self.timeout is not None else None
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["queued"] += 1
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._stats["queued"] -= 1
+                self._stats["running"] += 1
+                wait = started - enqueued
+                self._stats["wait_total"] += wait
+                self._stats["wait_max"] = max(self._stats["wait_max"], wait)
+            ok = False
+            try:
+                result = self._call(fn, args, kwargs, deadline)
+                ok = True
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._stats["running"] -= 1
+                    self._stats["completed" if ok else "failed"] += 1
+                    self._stats["run_total"] += elapsed
+                    self._stats["run_max"] = max(self._stats["run_max"], elapsed)
+                self._slots.release()
+
+        try:
+            return self._get_pool().submit(job)
+        except Exception:
+            with self._lock:
+                self._stats["queued"] -= 1
+            self._slots.release()
+            raise
+
+    def _call(self, fn, args, kwargs, deadline):
+        return fn(*args, **kwargs)
+
+    def run(self, fn, *args, **kwargs):
+        """submit() and wait up to self.timeout seconds; raises QueueFullError or TimeoutError."""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # A distinct class before Python 3.11; callers catch the builtin.
+            raise TimeoutError(f"{self.name} job took longer than {self.timeout}s") from None
+
+    def metrics(self):
+        with self._lock:
+            s = dict(self._stats)
+        started = s["submitted"] - s["queued"] - s["cancelled"]
+        done = s["completed"] + s["failed"]
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": s["running"],
+            "queue_depth": s["queued"],
+            "submitted": s["submitted"],
+            "rejected": s["rejected"],
+            "completed": s["completed"],
+            "failed": s["failed"],
+            "cancelled": s["cancelled"],
+            "wait_avg_ms": round(s["wait_total"] / started * 1000, 2) if started else 0.0,
+            "wait_max_ms": round(s["wait_max"] * 1000, 2),
+            "run_avg_ms": round(s["run_total"] / done * 1000, 2) if done else 0.0,
+            "run_max_ms": round(s["run_max"] * 1000, 2),
+        }
+
+
+def _child_main(conn):
+    # Child process loop: run (fn, args, kwargs) jobs until the parent closes the pipe.
+    # A forked child inherits the server's handlers (gunicorn's SIGTERM only sets a
+    # flag), which would keep it alive through terminate() and hang the worker's exit.
+    for name in ("SIGTERM", "SIGHUP", "SIGQUIT", "SIGUSR1", "SIGUSR2"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_DFL)
+    # Ctrl+C reaches the whole process group; the parent decides what happens to its jobs.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            fn, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            return
+        except Exception as e:  # the job could not be unpickled here
+            conn.send((False, RuntimeError(f"job could not be loaded in the child: {e!r}")))
+            continue
+        try:
+            result = (True, fn(*args, **kwargs))
+        except Exception as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception as e:  # unpicklable result or exception
+            conn.send((False, RuntimeError(f"job result could not be returned: {e!r}")))
+
+
+class ProcessBoundedExecutor(BoundedExecutor):
+    """
+    BoundedExecutor for CPU-bound jobs: each worker thread hands its job to
+    its own child process and waits. A job still running self.timeout seconds
+    after it was submitted is killed with its child, which is replaced on the
+    next job. fn, its arguments and its result must be picklable.
+
+    Children are forked where the platform allows it, so they start with the
+    parent's already imported and warmed modules.
+    """
+
+    def __init__(self, name, max_workers, max_queue, timeout):
+        super().__init__(name, max_workers, max_queue, timeout)
+        methods = multiprocessing.get_all_start_methods()
+        self._context = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        self._killed = 0
+
+    def _child(self):
+        child = getattr(self._local, "child", None)
+        if child is None or child[2] != os.getpid() or not child[0].is_alive():
+            if child is not None:
+                self._discard_child(child)
+            parent_conn, child_conn = self._context.Pipe()
+            process = self._context.Process(target=_child_main, args=(child_conn,),
+                                            name=f"{self.name}-child", daemon=True)
+            process.start()
+            child_conn.close()
+            child = self._local.child = (process, parent_conn, os.getpid())
+        return child
+
+    def _discard_child(self, child):
+        process, conn, pid = child
+        self._local.child = None
+        conn.close()
+        if pid == os.getpid():
+            process.kill()
+            process.join()
+
+    def _call(self, fn, args, kwargs, deadline):
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError(f"{self.name} job expired while queued")
+        child = self._child()
+        process, conn, _ = child
+        conn.send((fn, args, kwargs))
+        if not conn.poll(remaining):
+            self._discard_child(child)
+            with self._lock:
+                self._killed += 1
+            raise TimeoutError(f"{self.name} job took longer than {self.timeout}s")
+        try:
+            ok, value = conn.recv()
+        except (EOFError, OSError):
+            self._discard_child(child)
+            raise RuntimeError(f"{self.name} child process exited with code {process.exitcode}") from None
+        if ok:
+            return value
+        raise value
+
+    def submit(self, fn, *args, **kwargs):
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._release_cancelled)
+        return future
+
+    def _release_cancelled(self, future):
+        # A cancelled job never ran, so its finally: block never gave the slot back.
+        if future.cancelled():
+            with self._lock:
+                self._stats["queued"] -= 1
+                self._stats["cancelled"] += 1
+            self._slots.release()
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Like BoundedExecutor.run, but when it raises TimeoutError the job's slot
+        is already free: a queued job is cancelled, a running one has been killed.
+        """
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if not future.cancel():
+                # Running: _call() kills its child at this same deadline; wait the moments that takes.
+                wait_futures([future])
+            raise TimeoutError(f"{self.name} job took longer than {self.timeout}s") from None
+
+    def metrics(self):
+        report = super().metrics()
+        with self._lock:
+            report["killed"] = self._killed
+        return report